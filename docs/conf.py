@@ -14,19 +14,148 @@
 # All configuration values have a default; values that are commented out
 # serve to show the default.
 
-import sys, os, inspect
+import sys, os, errno
+import cPickle
 
 # Add root of the tree --> go to place before docs
+# Prepend it, such that this copy of pySPACE is imported and
+# not some other installation found on the path
 root_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
 if not root_dir in sys.path:
-    sys.path.append(root_dir)
+    sys.path.insert(0, root_dir)
 
 import pySPACE
+# pySPACE stays imported when Sphinx evaluates this file again in the same
+# process, so the configuration is only reloaded if the file changed
+_conf_file = os.path.join(pySPACE.configuration.conf_dir, "config.yaml")
 try:
-    pySPACE.load_configuration("config.yaml")
-except:
-    pass
-import pySPACE.missions.nodes
+    _conf_mtime = os.path.getmtime(_conf_file)
+except OSError:
+    _conf_mtime = None
+if getattr(pySPACE.configuration, "docs_conf_mtime", -1) != _conf_mtime:
+    try:
+        pySPACE.load_configuration("config.yaml")
+    except Exception:
+        pass
+    pySPACE.configuration.docs_conf_mtime = _conf_mtime
+
+
+def _rm(path):
+    """ Remove the file *path* if it exists """
+    try:
+        os.remove(path)
+    except OSError as e:
+        if e.errno != errno.ENOENT:
+            raise
+
+
+def _write_if_changed(path, content):
+    """ Write *content* to the file *path* if it differs from the current one
+
+    Unchanged files keep their modification time,
+    so Sphinx does not have to read them again.
+    """
+    try:
+        f = open(path)
+        unchanged = (f.read() == content)
+        f.close()
+        if unchanged:
+            return
+    except IOError as e:
+        if e.errno != errno.ENOENT:
+            raise
+    f = open(path, "w")
+    f.write(content)
+    f.close()
+
+
+def _load_node_index():
+    """ Get the class names and input types of all nodes
+
+    Collecting them requires to import all nodes, which takes a lot of time.
+    Hence, the result is cached in the build folder together with a key of
+    everything it depends on: the node modules (paths and modification
+    times), the configuration with the blacklisted nodes, the Python version
+    and the installed packages (modification times of the directories on
+    the path, which decide which optional nodes can be imported).
+    It is only recomputed when this key changed.
+
+    **Returns**
+
+        :fqn: node name --> fully qualified class name for all nodes
+        :fqn_default: the same for the default node names
+        :input_types: fully qualified class name --> input types
+    """
+    nodes_dir = os.path.join(root_dir, "pySPACE", "missions", "nodes")
+    node_files = sorted(
+        (os.path.relpath(os.path.join(folder, name), nodes_dir),
+         os.path.getmtime(os.path.join(folder, name)))
+        for folder, _, files in os.walk(nodes_dir)
+        for name in files if name.endswith(".py"))
+    blacklist = getattr(pySPACE.configuration, "blacklisted_nodes", None)
+    path_stamps = [(folder, os.path.getmtime(folder))
+                   for folder in sys.path if os.path.isdir(folder)]
+    stamp = (node_files, _conf_mtime, sorted(blacklist or []), sys.version,
+             path_stamps)
+    cache = os.path.join(os.path.dirname(__file__), ".build", "nodemap.pkl")
+    try:
+        f = open(cache, "rb")
+        try:
+            cached_stamp, index = cPickle.load(f)
+        finally:
+            f.close()
+        if cached_stamp == stamp:
+            return index
+    except Exception:
+        # missing, outdated or broken cache: import the nodes
+        pass
+
+    from pySPACE.missions import nodes
+    fqn = dict((key, value.__module__ + "." + value.__name__)
+               for key, value in nodes.NODE_MAPPING.items())
+    fqn_default = dict(
+        (key, value.__module__ + "." + value.__name__)
+        for key, value in nodes.DEFAULT_NODE_MAPPING.items())
+    input_types = {}
+    for key, value in nodes.NODE_MAPPING.items():
+        if not fqn[key] in input_types:
+            try:
+                input_types[fqn[key]] = list(value.get_input_types())
+            except NotImplementedError:
+                # e.g. source nodes without input types
+                input_types[fqn[key]] = []
+    index = (fqn, fqn_default, input_types)
+
+    if not os.path.isdir(os.path.dirname(cache)):
+        os.makedirs(os.path.dirname(cache))
+    f = open(cache, "wb")
+    cPickle.dump((stamp, index), f, protocol=2)
+    f.close()
+    return index
+
+_NODE_INDEX = {}
+
+def _node_index():
+    """ Load the node index on first use and keep it for this process
+
+    Nodes are only imported (see :func:`_load_node_index`) when the index
+    is required and the cache is outdated. Sphinx imports the modules
+    for autodoc anyway, but only once per process.
+
+    **Returns**
+
+        Dictionary with the entries of :func:`_load_node_index`
+        (*fqn*, *fqn_default*, *input_types*) and *reverse*,
+        the mapping of fully qualified class names to node names.
+    """
+    if not _NODE_INDEX:
+        fqn, fqn_default, input_types = _load_node_index()
+        reverse = {}
+        for key, class_name in fqn.items():
+            reverse.setdefault(class_name, []).append(key)
+        _NODE_INDEX.update(fqn=fqn, fqn_default=fqn_default,
+                           input_types=input_types, reverse=reverse)
+    return _NODE_INDEX
 
 # If your extensions are in another directory, add it here. If the directory
 # is relative to the documentation root, use os.path.abspath to make it
@@ -39,6 +168,9 @@ import pySPACE.missions.nodes
 # Add any Sphinx extension module names here, as strings. They can be extensions
 # coming with Sphinx (named 'sphinx.ext.*') or your custom ones.
 # autodoc is an extension to extract documentation automatically
+# (sphinx-autoapi would avoid importing the modules, but it requires
+# Python 3 and does not support the autosummary and autoclass directives
+# used in the generated api files and node lists)
 # viewcode is an extension to link the corresponding sourcecode
 # as a link automatically with syntax highlighting
 extensions = ['sphinx.ext.autodoc',
@@ -269,9 +401,8 @@ def fix_sig(app, what, name, obj, options, signature,
     """
     if 'class' == what:
         # underline class name manually
-        new_signature="\n"
-        new_signature+="-"*(len(str(name))+7) # 'class ' is not included in length
-        new_signature+="\n"
+        # ('class ' is not included in length)
+        parts = ["\n", "-"*(len(name)+7), "\n"]
         if signature:
             # delete beginning and ending brackets
             parameters = signature #[1:-1]
@@ -282,29 +413,28 @@ def fix_sig(app, what, name, obj, options, signature,
                 # unfortunately this is done in bold for unknown reasons
                 # (probably the first newline is the reason)
                 # extra dot is added for extra blank line
-                new_signature+=".\n"
-                new_signature+="Parameters:"
-                new_signature+="\n\n"
                 # the parameters should be indented but this doesn't work
-                new_signature+="        "
-                new_signature+=parameters
-        return (new_signature, return_annotation)
+                parts.extend([".\n", "Parameters:", "\n\n", "        ",
+                              parameters])
+        return ("".join(parts), return_annotation)
     else:
         return (signature, return_annotation)
 
+# class components not listed in the class components summary
+_SKIP_METHODS = frozenset(["__doc__", "__module__", "__metaclass__",
+                           "__dict__", "__init__", "__weakref__"])
+
 def missing_docstring(app, what, name, obj, options, lines):
     """ Construct a list of components having no docsting 
     
     .. todo:: Discover where the 'type ERROR' comes from in CCS
     """
     if len(lines)==0 and not str(name).endswith("__init__"):
-        f = open(os.path.join(os.path.dirname(__file__),".build","html","undocumented.txt"),"a")
-        f.write(str(name)+"\n")
+        app._undoc_fh.write(str(name)+"\n")
     else:
         for line in lines:
             if "document" in line and "todo" in line:
-                f = open(os.path.join(os.path.dirname(__file__),".build","html","undocumented.txt"),"a")
-                f.write("\n"+str(name)+"\n"+line+"\n \n")
+                app._undoc_fh.write("\n"+str(name)+"\n"+line+"\n \n")
 
     if 'class' == what and str(name).endswith("Node"):
         # e.g. pySPACE.missions.nodes.spatial_filtering.spatial_filtering.SpatialFilteringNode
@@ -312,9 +442,8 @@ def missing_docstring(app, what, name, obj, options, lines):
         lines.append("")
         lines.append(":POSSIBLE NODE NAMES:")
         lines.append("")
-        for key, value in pySPACE.missions.nodes.NODE_MAPPING.items():
-            if value.__module__+"."+value.__name__==name:
-                lines.append("    - **"+key+"**")
+        for key in _node_index()["reverse"].get(name, ()):
+            lines.append("    - **"+key+"**")
         lines.append("")
         lines.append("")
 
@@ -323,11 +452,8 @@ def missing_docstring(app, what, name, obj, options, lines):
         lines.append("")
         lines.append(":POSSIBLE INPUT TYPES:")
         lines.append("")
-        for key, value in pySPACE.missions.nodes.NODE_MAPPING.items():
-            if value.__module__+"."+value.__name__==name:
-                for input_type in value.get_input_types():
-                    lines.append("    - **"+input_type+"**")
-                break
+        for input_type in _node_index()["input_types"].get(name, ()):
+            lines.append("    - **"+input_type+"**")
         lines.append("")
         lines.append("")
 
@@ -343,9 +469,11 @@ def missing_docstring(app, what, name, obj, options, lines):
         new_lines.append("")
         new_lines.append(".. autosummary::")
         new_lines.append("")
-        method_list = inspect.getmembers(obj) #,inspect.ismethod
+        # only components defined in the class itself are listed,
+        # so there is no need to walk the inherited members
+        method_list = sorted(obj.__dict__.items())
         for method,value in method_list:
-            if not method in ["__doc__","__module__","__metaclass__","__dict__","__init__","__weakref__"] and method in obj.__dict__.keys():
+            if not method in _SKIP_METHODS:
                 new_lines.append("    "+method)
 #                if "type" in obj.__name__ or "type" in method or "except" in new_lines[-1]:
 #                    print obj
@@ -361,7 +489,8 @@ def missing_docstring(app, what, name, obj, options, lines):
 
 
 def setup(app):
-    """ Activate fix_sig and missing_docstring and delete old 'undocumented.txt'
+    """ Activate fix_sig and missing_docstring, delete old 'undocumented.txt'
+    and generate the rst files of nodes and examples when the build starts
     
     .. todo:: Fix file handling. Only works with 'make html_complete'
     """
@@ -370,265 +499,290 @@ def setup(app):
     # clean up auto-un-documentation files
     fname = os.path.join(os.path.dirname(__file__), ".build", "html",
                          "undocumented.txt")
-    if os.access(fname, os.F_OK):
-        os.remove(fname)
+    _rm(fname)
+    # open the list only once and fill it during the build
+    if not os.path.isdir(os.path.dirname(fname)):
+        os.makedirs(os.path.dirname(fname))
+    app._undoc_fh = open(fname, "a", 65536)
+    app.connect('build-finished', close_undocumented)
+    # generate the rst files before the sources are read
+    app.connect('builder-inited', generate_files)
+
+def close_undocumented(app, exception):
+    """ Flush and close the list of undocumented components """
+    app._undoc_fh.close()
 
 ######################### preparation #########################################
 
-# delete old list of nodes
-fname = os.path.join(os.path.dirname(__file__), "nodes.rst")
-if os.access(fname, os.F_OK):
-    os.remove(fname)
-
 location = "pySPACE.missions.nodes"
 offset = len(location) + 1
-node_list = []
-for key, value in pySPACE.missions.nodes.DEFAULT_NODE_MAPPING.items():
-    node_list.append(value.__module__ + "." + value.__name__)
-node_list.sort()
-
-######################### header ###############################################
-
-f = open(fname, "a")
-f.write(".. AUTO-GENERATED FILE -- DO NOT EDIT! (conf.py)\n")
-f.write(".. _node_list: \n")
-f.write("\n")
-f.write("List of all Nodes \n")
-f.write("======================= \n")
-f.write("\n")
-n = len(node_list)
-f.write("pySPACE comes along with a big choice of %d processing nodes.\n" % n)
-f.write("This includes numerous wrappers around optional external libraries.\n")
-f.write("They can be accessed via the "
-    ":class:`~pySPACE.missions.operations.node_chain.NodeChainOperation`.\n")
-f.write("In the following you can get an overview on their functionality, \n")
-f.write("the mapping from node names in specification files \n")
-f.write("to the node class and vice versa.\n")
-f.write("\n")
-f.write("For details on the usage of the nodes and for getting usage examples, "
-        "have a look at their documentation.\n")
-
-######################### node summary #########################################
-
-f.write("\n")
-f.write("Mapping of Class Names to Functionality \n")
-f.write("--------------------------------------- \n")
-f.write("\n")
-#f.write("\n.. currentmodule:: %s\n\n"%location)
-#f.write(".. autosummary:: \n")
-#f.write("    :nosignatures:\n")
-#f.write("    :toctree: nodes\n")
-f.write("\n")
-current_location = ""
-for node in node_list:
-    if not node == "pySPACE.missions.nodes.base_node.BaseNode" and \
-       not "template" in node:
-        new_location = node[offset:].split(".")[0]
+
+######################### node list ###########################################
+
+def gen_nodes_rst():
+    """ Generate the list of all nodes with their names (nodes.rst) """
+    fname = os.path.join(os.path.dirname(__file__), "nodes.rst")
+
+    # (class name, subcategory, whether it is excluded from the summary)
+    node_list = [(node, node[offset:].split(".")[0],
+                  node == "pySPACE.missions.nodes.base_node.BaseNode"
+                  or "template" in node)
+                 for node in _node_index()["fqn_default"].values()]
+    node_list.sort(key=lambda entry: entry[0][offset:].lower())
+
+    ######################### header ###########################################
+
+    parts = []
+    parts.append(".. AUTO-GENERATED FILE -- DO NOT EDIT! (conf.py)\n")
+    parts.append(".. _node_list: \n")
+    parts.append("\n")
+    parts.append("List of all Nodes \n")
+    parts.append("======================= \n")
+    parts.append("\n")
+    n = len(node_list)
+    parts.append("pySPACE comes along with a big choice of %d processing nodes.\n" % n)
+    parts.append("This includes numerous wrappers around optional external libraries.\n")
+    parts.append("They can be accessed via the "
+        ":class:`~pySPACE.missions.operations.node_chain.NodeChainOperation`.\n")
+    parts.append("In the following you can get an overview on their functionality, \n")
+    parts.append("the mapping from node names in specification files \n")
+    parts.append("to the node class and vice versa.\n")
+    parts.append("\n")
+    parts.append("For details on the usage of the nodes and for getting usage examples, "
+            "have a look at their documentation.\n")
+
+    ######################### node summary #####################################
+
+    parts.append("\n")
+    parts.append("Mapping of Class Names to Functionality \n")
+    parts.append("--------------------------------------- \n")
+    parts.append("\n")
+    #parts.append("\n.. currentmodule:: %s\n\n"%location)
+    #parts.append(".. autosummary:: \n")
+    #parts.append("    :nosignatures:\n")
+    #parts.append("    :toctree: nodes\n")
+    parts.append("\n")
+    current_location = ""
+    for node, new_location, skip in node_list:
+        if skip:
+            continue
         # write heading for node subcategory description
         if not new_location == current_location:
             current_module = location + "." + new_location
-            f.write("\n")
-            f.write("%s\n" % new_location)
-            f.write("+" * (len(new_location)) + "\n")
-            f.write(" \n|\n\n")
-            f.write(".. currentmodule:: %s\n" % location)
-            f.write(".. autosummary:: \n\n    %s\n\n|\n\n"
+            parts.append("\n")
+            parts.append("%s\n" % new_location)
+            parts.append("+" * (len(new_location)) + "\n")
+            parts.append(" \n|\n\n")
+            parts.append(".. currentmodule:: %s\n" % location)
+            parts.append(".. autosummary:: \n\n    %s\n\n|\n\n"
                     % current_module[offset:])
             # if not current_module=="pySPACE.missions.nodes.splitter":
-            #     f.write(".. automodule:: %s\n    :no-members:\n\n"%current_module)
+            #     parts.append(".. automodule:: %s\n    :no-members:\n\n"%current_module)
             # else:
-            #     f.write("Control how data is split into training and testing data\n\n")
-            f.write(".. currentmodule:: %s\n" % current_module)
-            f.write(".. autosummary:: \n")
-            f.write("    :nosignatures:\n")
-            f.write("\n")
+            #     parts.append("Control how data is split into training and testing data\n\n")
+            parts.append(".. currentmodule:: %s\n" % current_module)
+            parts.append(".. autosummary:: \n")
+            parts.append("    :nosignatures:\n")
+            parts.append("\n")
             current_location = new_location
 
         current_offset = len(current_module) + 1
-        f.write("    " + node[current_offset:] + "\n")
-f.write("\n")
+        parts.append("    " + node[current_offset:] + "\n")
+    parts.append("\n")
 
-######################### new name mapping list ###############################
+    ######################### new name mapping list ###########################
 
-node_name_dict = pySPACE.missions.nodes.NODE_MAPPING
-name_list = [(name, value.__module__[offset:] + "." + value.__name__)
-             for name, value in node_name_dict.items()]
+    name_list = [(name, class_name[offset:])
+                 for name, class_name in _node_index()["fqn"].items()]
 
-######################### node name --> class name ############################
+    ######################### node name --> class name ########################
 
-f.write(".. currentmodule:: %s\n\n" % location)
+    parts.append(".. currentmodule:: %s\n\n" % location)
 
-f.write("Mapping of Node Names to Class Names \n")
-f.write("------------------------------------ \n")
-f.write("\n")
-name_list.sort(key=lambda x: x[0].lower())
-for name,class_name in name_list:
-    f.write("    - " + name + ": " + ":class:`" + class_name + "`" + "\n")
+    parts.append("Mapping of Node Names to Class Names \n")
+    parts.append("------------------------------------ \n")
+    parts.append("\n")
+    name_list.sort(key=lambda x: x[0].lower())
+    for name,class_name in name_list:
+        parts.append("    - " + name + ": " + ":class:`" + class_name + "`" + "\n")
 
-######################### class name --> node name ############################
+    ######################### class name --> node name ########################
 
-f.write("\n")
-f.write("Mapping of Class Names to Node Names \n")
-f.write("------------------------------------ \n")
-f.write("\n")
-name_list.sort(key=lambda x: (x[1].lower(), x[0]))
-for name, class_name in name_list:
-    f.write("    - " + ":class:`" + class_name + "`" + ": " + name + "\n")
+    parts.append("\n")
+    parts.append("Mapping of Class Names to Node Names \n")
+    parts.append("------------------------------------ \n")
+    parts.append("\n")
+    name_list.sort(key=lambda x: (x[1].lower(), x[0]))
+    for name, class_name in name_list:
+        parts.append("    - " + ":class:`" + class_name + "`" + ": " + name + "\n")
 
-######################### class name --> example ##############################
+    ######################### class name --> example ##########################
 
-# f.write("\n")
-# f.write("Mapping of Class Names to Example Dictionary \n")
-# f.write("-------------------------------------------- \n")
-# f.write("\n")
-# name_list.sort(key=lambda x: (x[1].lower(), x[0]))
-# for name, class_name in name_list:
-#     f.write("    - " + ":class:`" + class_name + "`" + ": " + name + "\n")
-f.close()
+    # parts.append("\n")
+    # parts.append("Mapping of Class Names to Example Dictionary \n")
+    # parts.append("-------------------------------------------- \n")
+    # parts.append("\n")
+    # name_list.sort(key=lambda x: (x[1].lower(), x[0]))
+    # for name, class_name in name_list:
+    #     parts.append("    - " + ":class:`" + class_name + "`" + ": " + name + "\n")
+    _write_if_changed(fname, "".join(parts))
 
 ######################### operation example list #############################
 
-#examples operations
-fname=os.path.join(os.path.dirname(__file__),"examples","operations.rst")
-if os.access(fname,os.F_OK):
-    os.remove(fname)
-
-specs_path=os.path.join(os.path.dirname(__file__),"examples","specs")
-
-examples=os.path.join(specs_path,"operations","examples")
-
-f=open(fname,"a")
-       
-f.write(".. _operation_examples: \n")
-f.write("\n")
-f.write("Operation Examples \n")
-f.write("=========================== \n")
-f.write("\n")
-f.write("These are examples of yaml files you can use as a template\n")
-f.write("for your own operations. For details on operations have a look at the respective documentation.\n")
-f.write("\n")
-# adding example files
-for folder, _, files in os.walk(examples):
-    for fname in files:
-        f.write(fname + "\n")
-        f.write("------------------------------------------\n")
-        f.write("\n")
-        f.write(".. literalinclude:: " + os.path.join("specs","operations","examples",fname) + "\n")
-        f.write("\t" + ":language: yaml" + "\n")
-        f.write("\n")
-f.close()
+def gen_operation_examples():
+    """ Generate the page with the operation examples """
+    #examples operations
+    fname=os.path.join(os.path.dirname(__file__),"examples","operations.rst")
+
+    specs_path=os.path.join(os.path.dirname(__file__),"examples","specs")
+
+    examples=os.path.join(specs_path,"operations","examples")
+
+    parts = []
+
+    parts.append(".. _operation_examples: \n")
+    parts.append("\n")
+    parts.append("Operation Examples \n")
+    parts.append("=========================== \n")
+    parts.append("\n")
+    parts.append("These are examples of yaml files you can use as a template\n")
+    parts.append("for your own operations. For details on operations have a look at the respective documentation.\n")
+    parts.append("\n")
+    # adding example files (the example folder is flat)
+    example_files = sorted(name for name in os.listdir(examples)
+                           if os.path.isfile(os.path.join(examples, name)))
+    for example_file in example_files:
+        parts.append(example_file + "\n")
+        parts.append("------------------------------------------\n")
+        parts.append("\n")
+        parts.append(".. literalinclude:: " + os.path.join("specs","operations","examples",example_file) + "\n")
+        parts.append("\t" + ":language: yaml" + "\n")
+        parts.append("\n")
+    _write_if_changed(fname, "".join(parts))
 
 ######################### operation chain example list ########################
 
-#examples operation_chains
-examples=os.path.join(specs_path,"operation_chains","examples")
-
-fname=os.path.join(os.path.dirname(__file__),"examples","operation_chains.rst")
-if os.access(fname,os.F_OK):
-    os.remove(fname)
-
-f=open(fname,"a")
-       
-f.write(".. _operation_chain_examples: \n")
-f.write("\n")
-f.write("Operation Chain Examples \n")
-f.write("============================ \n")
-f.write("\n")
-f.write("These are examples of yaml files you can use as a template\n")
-f.write("for your own operation chains. For details on operation chains have a look at the respective documentation.\n")
-f.write("\n")
-# adding example files
-for folder, _, files in os.walk(examples):
-    for fname in files:
-        f.write(fname + "\n")
-        f.write("------------------------------------------\n")
-        f.write("\n")
-        f.write(".. literalinclude:: " + os.path.join("specs","operation_chains","examples",fname) + "\n")
-        f.write("\t" + ":language: yaml" + "\n")
-        f.write("\n")
-f.close()
+def gen_operation_chain_examples():
+    """ Generate the page with the operation chain examples """
+    #examples operation_chains
+    specs_path=os.path.join(os.path.dirname(__file__),"examples","specs")
+    examples=os.path.join(specs_path,"operation_chains","examples")
+
+    fname=os.path.join(os.path.dirname(__file__),"examples","operation_chains.rst")
+
+    parts = []
+
+    parts.append(".. _operation_chain_examples: \n")
+    parts.append("\n")
+    parts.append("Operation Chain Examples \n")
+    parts.append("============================ \n")
+    parts.append("\n")
+    parts.append("These are examples of yaml files you can use as a template\n")
+    parts.append("for your own operation chains. For details on operation chains have a look at the respective documentation.\n")
+    parts.append("\n")
+    # adding example files (the example folder is flat)
+    example_files = sorted(name for name in os.listdir(examples)
+                           if os.path.isfile(os.path.join(examples, name)))
+    for example_file in example_files:
+        parts.append(example_file + "\n")
+        parts.append("------------------------------------------\n")
+        parts.append("\n")
+        parts.append(".. literalinclude:: " + os.path.join("specs","operation_chains","examples",example_file) + "\n")
+        parts.append("\t" + ":language: yaml" + "\n")
+        parts.append("\n")
+    _write_if_changed(fname, "".join(parts))
 
 ######################### preparation of external node documentation ##########
 
-# delete old list of nodes
-fname=os.path.join(os.path.dirname(__file__),"external_nodes.rst")
-if os.access(fname,os.F_OK):
-    os.remove(fname)
-
-location = "pySPACE.missions.nodes"
-offset = len(location)+1
-f=open(fname,"a")
-
-######################### header ###############################################
-
-f.write(".. AUTO-GENERATED FILE -- DO NOT EDIT! (conf.py)\n")
-f.write(".. _external_nodes: \n")
-f.write("\n")
-f.write("Documentation of External and Wrapped Nodes \n")
-f.write("=========================================== \n")
-f.write("\n")
-f.write("pySPACE comes along with wrappers to external algorithms.\n")
-
-f.write("\n")
-f.write("For details on the usage of the nodes and for getting usage examples, \n"
-        "have a look at their documentation.\n")
-
-node_list = []
-for key, value in pySPACE.missions.nodes.DEFAULT_NODE_MAPPING.items():
-    if value.__module__ == "pySPACE.missions.nodes.external":
-        node_list.append(value.__module__+"."+value.__name__)
-node_list.sort()
-
-if len(node_list) > 0:
-    f.write("\n")
-    f.write(".. _external_folder: \n")
-    f.write("\n")
-    f.write("External Nodes \n")
-    f.write("-------------- \n")
-    f.write("\n")
-    f.write("Nodes from :mod:`external folder <pySPACE.missions.nodes.external>`\n\n")
-    cl = ""
-    for node in node_list:
-        cl += "\n:class:`" + node + "`\n"
-        cl += "~"*(len(node)+9)+"\n\n"
-        cl += ".. autoclass:: %s\n" % node
-        cl += "    :noindex:\n\n"
-
-
-    f.write(cl)
-else:
-    f.write("Module for external node wrapping: :mod:`pySPACE.missions.nodes.external`\n")
-
-######################### scikit nodes #########################################
-
-node_list = []
-for key, value in pySPACE.missions.nodes.DEFAULT_NODE_MAPPING.items():
-    if value.__name__.endswith("SklearnNode"):
-        node_list.append(value.__module__+"."+value.__name__)
-node_list.sort()
-
-if len(node_list) > 0:
-    f.write("\n")
-    f.write(".. _scikit_nodes: \n")
-    f.write("\n")
-    f.write("Scikit Nodes \n")
-    f.write("------------ \n")
-    f.write("\n")
-    f.write("Nodes from :mod:`scikits wrapper <pySPACE.missions.nodes.scikits_nodes>`\n\n")
-    cl = ""
-    for node in node_list:
-        cl += "\n:class:`" + node + "`\n"
-        cl += "~"*(len(node)+9)+"\n\n"
-        cl += ".. autoclass:: %s\n    :no-members:\n\n" % node
-
-    f.write(cl)
-
-f.close()
-
+def gen_external_rst():
+    """ Generate the documentation of external and wrapped nodes """
+    fname=os.path.join(os.path.dirname(__file__),"external_nodes.rst")
+
+    parts = []
+
+    ######################### header ###########################################
+
+    parts.append(".. AUTO-GENERATED FILE -- DO NOT EDIT! (conf.py)\n")
+    parts.append(".. _external_nodes: \n")
+    parts.append("\n")
+    parts.append("Documentation of External and Wrapped Nodes \n")
+    parts.append("=========================================== \n")
+    parts.append("\n")
+    parts.append("pySPACE comes along with wrappers to external algorithms.\n")
+
+    parts.append("\n")
+    parts.append("For details on the usage of the nodes and for getting usage examples, \n"
+            "have a look at their documentation.\n")
+
+    node_list = []
+    for class_name in _node_index()["fqn_default"].values():
+        if class_name.rsplit(".", 1)[0] == "pySPACE.missions.nodes.external":
+            node_list.append(class_name)
+    node_list.sort(key=lambda node: node[offset:].lower())
+
+    if len(node_list) > 0:
+        parts.append("\n")
+        parts.append(".. _external_folder: \n")
+        parts.append("\n")
+        parts.append("External Nodes \n")
+        parts.append("-------------- \n")
+        parts.append("\n")
+        parts.append("Nodes from :mod:`external folder <pySPACE.missions.nodes.external>`\n\n")
+        for node in node_list:
+            parts.append("\n:class:`" + node + "`\n")
+            parts.append("~"*(len(node)+9)+"\n\n")
+            parts.append(".. autoclass:: %s\n" % node)
+            parts.append("    :noindex:\n\n")
+    else:
+        parts.append("Module for external node wrapping: :mod:`pySPACE.missions.nodes.external`\n")
+
+    ######################### scikit nodes #####################################
+
+    node_list = []
+    for class_name in _node_index()["fqn_default"].values():
+        if class_name.endswith("SklearnNode"):
+            node_list.append(class_name)
+    node_list.sort(key=lambda node: node[offset:].lower())
+
+    if len(node_list) > 0:
+        parts.append("\n")
+        parts.append(".. _scikit_nodes: \n")
+        parts.append("\n")
+        parts.append("Scikit Nodes \n")
+        parts.append("------------ \n")
+        parts.append("\n")
+        parts.append("Nodes from :mod:`scikits wrapper <pySPACE.missions.nodes.scikits_nodes>`\n\n")
+        for node in node_list:
+            parts.append("\n:class:`" + node + "`\n")
+            parts.append("~"*(len(node)+9)+"\n\n")
+            parts.append(".. autoclass:: %s\n    :no-members:\n\n" % node)
+
+    _write_if_changed(fname, "".join(parts))
+
+######################### generation ##########################################
+
+def generate_files(app):
+    """ Run the independent generators of the rst files in parallel
+
+    Connected to Sphinx's *builder-inited* event, so that the nodes are only
+    loaded when documents are built and not whenever this file is evaluated.
+    """
+    # load the shared index before the threads start
+    _node_index()
+    from multiprocessing.pool import ThreadPool
+    pool = ThreadPool(4)
+    pool.map(lambda generate: generate(),
+             [gen_nodes_rst, gen_external_rst,
+              gen_operation_examples, gen_operation_chain_examples])
+    pool.close()
+    pool.join()
 
 
 inheritance_graph_attrs = dict(rankdir="TB",fontsize=5,ratio='compress',nodesep=0.1,sep=0.1, pad=0.001,size= '"10.0, 25.0"') #, size='""'
 graphviz_output_format  = 'png' #'svg' svg is good for scaling but linking seems to work only with png
+# Rendered graphs are named by a hash of their dot code and options,
+# and Sphinx only calls dot for graphs without an existing image.
+# Builds that keep the .build folder (e.g. 'make html_short') reuse them.
 #inheritance_node_attrs = dict(shape='rectangle', fontsize=8, height=0.7,
 #                              color='grey', style='filled')
 inheritance_node_attrs = dict(shape='rectangle', fontsize=10, height=0.02,width=0.02,margin=0.005)
@@ -1,6 +1,6 @@
 """ Sink-Node for the Signal-to-Signal-Plus-Noise Ratio. """
 
-from copy import copy, deepcopy
+from copy import copy
 
 import numpy
 
@@ -106,24 +106,17 @@ class SSNRSinkNode(BaseNode):
                        "ssnr_vs": self.ssnr.ssnr_vs()}
 
         # Collect test data (if any)
-        X_test = None
-        D_test = None
+        X_test = []
+        labels_test = []
         for data, label in self.input_node.request_data_for_testing():
-            if label == self.erp_class_label:
-                D = numpy.diag(numpy.ones(data.shape[0]))
-            else:
-                D = numpy.zeros((data.shape[0], data.shape[0]))
-
-            if X_test is None:
-                X_test = deepcopy(data)  # TODO: Why deep copy? data is not used anymore afterwards!
-                D_test = D
-            else:
-                X_test = numpy.vstack((X_test, data))
-                D_test = numpy.vstack((D_test, D))
+            labels_test.append(label)
+            X_test.append(data.view(numpy.ndarray))
 
         # If there was separate test data: compute metrics that require test data
-        if X_test is not None:
-            performance["ssnr_vs_test"] = self.ssnr.ssnr_vs_test(X_test, D_test)
+        if X_test:
+            performance["ssnr_vs_test"] = \
+                self.ssnr.ssnr_vs_test(numpy.concatenate(X_test),
+                                       labels_test)
 
         # Add SSNR-based metrics computed in this split to result collection
         self.ssnr_collection.add_split(performance, train=False,
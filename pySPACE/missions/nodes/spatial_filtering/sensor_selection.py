@@ -469,11 +469,8 @@ class SensorSelectionSSNRNode(SensorSelectionBase):
           :objective_function: The objective function that is used to determine
                which sensor selection are well suited and which less suited.
                Available objective functions are "ssnr_vs" (the signal to 
-               signal-plus-noise ratio in virtual sensor space), "ssnr_as" 
-               (the signal to signal-plus-noise ratio in actual sensor space),
-               "ssnr_vs_test" (the minimum signal to signal-plus-noise ratio
-               in virtual sensor space when one of selected sensors wouldn't
-               be present)
+               signal-plus-noise ratio in virtual sensor space) and "ssnr_as"
+               (the signal to signal-plus-noise ratio in actual sensor space).
                 
                 (*optional, default: "ssnr_vs"*)
                 
@@ -545,7 +542,7 @@ class SensorSelectionSSNRNode(SensorSelectionBase):
             "Unknown search heuristic %s. Must be in %s." % (search_heuristic,
                                                              search_heuristics)
 
-        objective_functions = ["ssnr_vs", "ssnr_as", "ssnr_vs_test"]
+        objective_functions = ["ssnr_vs", "ssnr_as"]
 
         assert objective_function in objective_functions, \
             "Unknown objective function %s. Must be in %s." % \
@@ -579,9 +576,6 @@ class SensorSelectionSSNRNode(SensorSelectionBase):
         # Determine objective function
         if self.objective_function == "ssnr_vs":
             objective_function = lambda selection: self.ssnr.ssnr_vs(selection)
-        elif self.objective_function == "ssnr_vs_test":
-            objective_function = \
-                lambda selection: self.ssnr.ssnr_vs_test(selection)
         elif self.objective_function == "ssnr_as":
             objective_function = lambda selection: self.ssnr.ssnr_as(selection)
 
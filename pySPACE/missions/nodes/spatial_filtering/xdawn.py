@@ -1,8 +1,9 @@
 """ xDAWN and variants for enhancing event-related potentials """
 
 import os
+import re
 import cPickle
-from copy import deepcopy, copy
+from copy import copy
 import warnings
 
 import numpy
@@ -11,13 +12,44 @@ from pySPACE.resources.dataset_defs.metric import BinaryClassificationDataset
 
 try:
     import scipy
-    if map(int, __import__("scipy").__version__.split('.')) < [0,8,0]:
+    # version as a tuple of ints, parsed once (ignores suffixes like "rc1")
+    _SCIPY_VERSION = tuple(int(re.match(r"\d*", part).group() or 0)
+                           for part in scipy.__version__.split('.')[:3])
+    if _SCIPY_VERSION < (0, 8, 0):
         from scipy.linalg.decomp import qr
     else:
         from scipy.linalg import qr
-except:
+    from scipy.linalg import solve_triangular, svd, eigh, cho_factor, \
+        cho_solve, get_blas_funcs, get_lapack_funcs
+    # eigh selects a part of the spectrum with "subset_by_index" since
+    # scipy 1.5, older versions use "eigvals"
+    if _SCIPY_VERSION >= (1, 5):
+        _EIGH_SUBSET_KEYWORD = "subset_by_index"
+    else:
+        _EIGH_SUBSET_KEYWORD = "eigvals"
+    # The check for non-finite entries of the decompositions can be skipped
+    # since scipy 0.13 (the callers check their data themselves)
+    if _SCIPY_VERSION >= (0, 13):
+        _NO_FINITE_CHECK_KW = dict(check_finite=False)
+    else:
+        _NO_FINITE_CHECK_KW = dict()
+    # Keyword arguments for an economic QR decomposition
+    if _SCIPY_VERSION >= (0, 9):
+        _SCIPY_QR_KW = dict(mode='economic', **_NO_FINITE_CHECK_KW)
+    else:
+        _SCIPY_QR_KW = dict(econ=True)
+except ImportError:
     pass
 
+try:
+    from numba import njit
+    _NUMBA_AVAILABLE = True
+except ImportError:
+    _NUMBA_AVAILABLE = False
+    def njit(*args, **kwargs):
+        """ Replacement for numba's njit decorator if numba is missing """
+        return lambda function: function
+
 from pySPACE.missions.nodes.base_node import BaseNode
 from pySPACE.missions.nodes.spatial_filtering.spatial_filtering \
     import SpatialFilteringNode
@@ -84,7 +116,8 @@ class XDAWNNode(SpatialFilteringNode):
             
         :load_filter_path: An absolute path from which the spatial filters can
             be loaded. If not specified, these filters are learned from the 
-            training data.
+            training data. Both the *patterns_sp<split>.npz* files written
+            by this node and pickled filters are supported.
 
             (*optional, default: None*)
 
@@ -135,18 +168,33 @@ class XDAWNNode(SpatialFilteringNode):
         filters = None
         # Load patterns from file if requested
         if not load_filter_path is None:
-            filters_file = open(load_filter_path, 'r')
-            filters = cPickle.load(filters_file)
-            filters_file.close()
+            if load_filter_path.endswith(".npz"):
+                filters_file = numpy.load(load_filter_path)
+                filters = filters_file["filters"]
+                filters_file.close()
+            else:
+                # Legacy format: pickled filters or (filters, wi, ai) tuple
+                filters_file = open(load_filter_path, 'rb')
+                filters = cPickle.load(filters_file)
+                filters_file.close()
+                if isinstance(filters, tuple):
+                    filters = filters[0]
         
         self.set_permanent_attributes(
             # Label of the class for which an ERP should be evoked.
             erp_class_label=erp_class_label,
             # The channel names
             channel_names=None,
-            # Matrices for storing data and stimuli  
+            # Matrix for storing data
             X=None,
-            D=None,
+            # The training data and whether it belongs to the ERP class,
+            # collected in _train (X is only constructed once in
+            # _stop_training)
+            _X_chunks=[],
+            _D_labels=[],
+            # Length of the windows and rows of X belonging to the ERP class
+            window_length=None,
+            target_mask=None,
             SNR=None,
             # The number of channels that will be retained
             retained_channels=retained_channels,
@@ -156,6 +204,8 @@ class XDAWNNode(SpatialFilteringNode):
             # the spatial filters that are used to project
             # the data onto a lower dimensional subspace
             filters=filters,
+            # The filters of the retained channels as used in _execute
+            _filters_active=None,
             # Determines whether the filters are stored after training
             visualize_pattern=visualize_pattern,
             xDAWN_channel_names=None)
@@ -183,79 +233,96 @@ class XDAWNNode(SpatialFilteringNode):
             self._log("To many channels chosen for the retained channels! "
                       "Replaced by maximum number.", level=logging.CRITICAL)
 
-        # Iteratively construct Toeplitz matrix D and data matrix X
-        if label == self.erp_class_label:
-            D = numpy.diag(numpy.ones(data.shape[0]))
-        else:
-            D = numpy.zeros((data.shape[0], data.shape[0]))
-            
-        if self.X is None:
-            self.X = deepcopy(data)
-            self.D = D
-        else:
-            self.X = numpy.vstack((self.X, data))
-            self.D = numpy.vstack((self.D, D))
-    
+        # Collect the data for the data matrix X and the Toeplitz matrix D;
+        # stacking them on every call would copy all previous data
+        self._X_chunks.append(data.view(numpy.ndarray))
+        self._D_labels.append(label == self.erp_class_label)
+
+    def _construct_training_matrices(self):
+        """ Construct data matrix X and target mask from the collected data
+
+        The target mask marks the rows of X that belong to examples of the
+        ERP class, i.e. the rows in which the Toeplitz matrix D is non-zero.
+        """
+        self.X = numpy.concatenate(self._X_chunks, axis=0)
+        self.window_length = self._X_chunks[0].shape[0]
+        self.target_mask = numpy.repeat(self._D_labels, self.window_length)
+        # the collected data is only kept in X and the target mask
+        self._X_chunks = []
+        self._D_labels = []
+
     def _stop_training(self, debug=False):
-        # The following if statement is needed only to account for
-        # different versions of scipy
-        if map(int, __import__("scipy").__version__.split('.')) >= [0, 9, 0]:
-            # NOTE: mode='economy'required since otherwise
-            # the memory consumption is excessive;
-            # QR decompositions of X
-            Qx, Rx = qr(self.X, overwrite_a=True, mode='economic')
-            # QR decompositions of D
-            Qd, Rd = qr(self.D, overwrite_a=True, mode='economic')
-        else:
-            # NOTE: econ=True required since otherwise
-            #       the memory consumption is excessive
-            # QR decompositions of X
-            Qx, Rx = qr(self.X, overwrite_a=True, econ=True)
-            # QR decompositions of D
-            Qd, Rd = qr(self.D, overwrite_a=True, econ=True)
-            
-        # self.X = None # Free memory
-        # self.D = None # Free memory
+        self._construct_training_matrices()
+        if not numpy.isfinite(self.X).all():
+            raise ValueError("Training data must not contain infs or NaNs.")
+        num_channels = self.X.shape[1]
+        # The BLAS/LAPACK routines are called directly, since their inputs
+        # are already checked and of matching type
+        gemm = get_blas_funcs('gemm', (self.X,))
+        geqrf, trtrs = get_lapack_funcs(('geqrf', 'trtrs'), (self.X,))
+
+        # QR decomposition of X; only the triangular factor Rx is needed
+        # below, so the orthogonal factor Qx = X*Rx^-1 is never formed
+        qr_x, tau, work, info = geqrf(self.X)
+        Rx = numpy.triu(qr_x[:num_channels])
+        del qr_x
+
+        # D stacks an identity block for each of the n examples of the ERP
+        # class (and zero blocks for all others), so D^T*D = n*I and the QR
+        # decomposition of D is Qd = D/sqrt(n), Rd = sqrt(n)*I. Hence, Qd.T Qx
+        # is the sum of the ERP blocks of Qx divided by sqrt(n), i.e.
+        # S*Rx^-1/sqrt(n) for the sum S of the ERP blocks of X, and D is
+        # neither constructed nor decomposed.
+        num_erp = numpy.count_nonzero(self.target_mask) // self.window_length
+        erp_sum = self.X[self.target_mask].reshape(
+            num_erp, self.window_length, num_channels).sum(axis=0)
+        self.X = None
+        QdTQx, info = trtrs(Rx, erp_sum.T, lower=0, trans=1)
+        if info > 0:
+            raise numpy.linalg.LinAlgError(
+                "Singular data matrix: channel %d is linearly dependent on "
+                "the preceding ones." % (info - 1))
+        QdTQx = QdTQx.T / numpy.sqrt(num_erp)
 
         # Singular value decomposition of Qd.T Qx
         # NOTE: full_matrices=True required since otherwise we do not get 
-        #       num_channels filters. 
+        #       num_channels filters. QdTQx is a temporary derived from the
+        #       already checked X, so it may be overwritten and its
+        #       finiteness need not be checked again.
         self.Phi, self.Lambda, self.Psi = \
-                    numpy.linalg.svd(numpy.dot(Qd.T, Qx), full_matrices=True)
+                    svd(QdTQx, full_matrices=True, overwrite_a=True,
+                        **_NO_FINITE_CHECK_KW)
         self.Psi = self.Psi.T
-       
-        SNR = numpy.zeros(self.X.shape[1])
-        # Construct the spatial filters
-        for i in range(self.Psi.shape[1]):
-            # Construct spatial filter with index i as Rx^-1*Psi_i
-            ui = numpy.dot(numpy.linalg.inv(Rx), self.Psi[:,i])
-            wi = numpy.dot(Rx.T, self.Psi[:,i]) 
-            if i < self.Phi.shape[1]:
-                ai = numpy.dot(numpy.dot(numpy.linalg.inv(Rd), self.Phi[:,i]),
-                               self.Lambda[i])
-            if i == 0:
-                self.filters = numpy.atleast_2d(ui).T
-                self.wi = numpy.atleast_2d(wi)
-                self.ai = numpy.atleast_2d(ai)
-            else:
-                self.filters = numpy.hstack((self.filters,
-                                             numpy.atleast_2d(ui).T))
-                self.wi = numpy.vstack((self.wi, numpy.atleast_2d(wi)))
-                if i < self.Phi.shape[1]:
-                    self.ai = numpy.vstack((self.ai, numpy.atleast_2d(ai)))
-            a = numpy.dot(self.D, ai.T)
-            b = numpy.dot(self.X, ui)
-#            b.view(numpy.ndarray)
-#            bb = numpy.dot(b.T, b)
-#            aa = numpy.dot(a.T, a)
-            SNR[i] = numpy.dot(a.T, a)/numpy.dot(b.T, b)
-
-        self.SNR = SNR
-        self.D = None
-        self.X = None
 
-    def _execute(self, data):
-        """ Apply the learned spatial filters to the given data point """
+        # Construct the spatial filters Rx^-1*Psi_i for all i at once; since
+        # Rx is upper triangular, a triangular solve replaces the inverse
+        self.filters, info = trtrs(Rx, self.Psi, lower=0)
+        # Spatial distribution patterns Rx^T*Psi_i (as rows)
+        self.wi = gemm(1.0, Rx, self.Psi, trans_a=1).T
+        # Signal components Rd^-1*Phi_i*Lambda_i (as rows), only defined
+        # for the available singular values
+        num_components = self.Lambda.shape[0]
+        self.ai = (self.Phi[:, :num_components] * self.Lambda
+                   / numpy.sqrt(num_erp)).T
+
+        # SNR of each filter as ||D*a_i||^2/||X*u_i||^2; D*a_i repeats a_i for
+        # each of the n ERP examples and filters without an own signal
+        # component reuse the last one. Since X*u_i = Qx*Psi_i and Psi is
+        # orthogonal, the noise power ||X*u_i||^2 is 1 for all filters.
+        signal_power = num_erp * numpy.einsum('ij,ij->i', self.ai, self.ai)
+        self.SNR = signal_power[numpy.minimum(
+            numpy.arange(self.filters.shape[1]), num_components - 1)]
+
+        # Keep the filters in Fortran order, so that the filters of the
+        # retained channels are a contiguous slice
+        self.filters = numpy.asfortranarray(self.filters)
+        self._filters_active = None
+
+    def _finalize_execute_state(self, data):
+        """ Fix channel settings and filters when the first data is executed
+
+        Nothing of this changes afterwards, so _execute only has to project.
+        """
         if self.channel_names is None:
             self.channel_names = data.channel_names
 
@@ -266,15 +333,24 @@ class XDAWNNode(SpatialFilteringNode):
             self.retained_channels = len(self.channel_names)
             self._log("To many channels chosen for the retained channels! "
                       "Replaced by maximum number.", level=logging.CRITICAL)
-        data_array=data.view(numpy.ndarray)
-        # Project the data using the learned spatial filters
-        projected_data = numpy.dot(data_array,
-                                   self.filters[:, :self.retained_channels])
-        
+
         if self.xDAWN_channel_names is None:
             self.xDAWN_channel_names = ["xDAWN%03d" % i 
                                         for i in range(self.retained_channels)]
-        
+
+        # Contiguous filters of the retained channels, reused for all
+        # further data (no copy for filters in Fortran order)
+        self._filters_active = numpy.asfortranarray(
+            self.filters[:, :self.retained_channels])
+
+    def _execute(self, data):
+        """ Apply the learned spatial filters to the given data point """
+        if self._filters_active is None:
+            self._finalize_execute_state(data)
+        # Project the data using the learned spatial filters
+        projected_data = numpy.dot(data.view(numpy.ndarray),
+                                   self._filters_active)
+
         return TimeSeries(projected_data, self.xDAWN_channel_names,
                           data.sampling_frequency, data.start_time,
                           data.end_time, data.name, data.marker_name)
@@ -286,11 +362,9 @@ class XDAWNNode(SpatialFilteringNode):
                 node_dir = os.path.join(result_dir, self.__class__.__name__)
                 create_directory(node_dir)
                 # This node only stores the learned spatial filters
-                name = "%s_sp%s.pickle" % ("patterns", self.current_split)
-                result_file = open(os.path.join(node_dir, name), "wb")
-                result_file.write(cPickle.dumps((self.filters, self.wi,
-                                                 self.ai), protocol=2))
-                result_file.close()
+                name = "%s_sp%s.npz" % ("patterns", self.current_split)
+                numpy.savez(os.path.join(node_dir, name), filters=self.filters,
+                            wi=self.wi, ai=self.ai)
                 
                 # Stores the signal to signal plus noise ratio resulted
                 # by the spatial filter
@@ -303,22 +377,13 @@ class XDAWNNode(SpatialFilteringNode):
                     from pySPACE.missions.nodes.spatial_filtering.csp \
                         import CSPNode
                     # Compute, accumulate and analyze signal components
-                    # estimated by xDAWN
-                    vmin = numpy.inf
-                    vmax = -numpy.inf
-    
-                    signal_components = []
-                    complete_signal = numpy.zeros((self.wi.shape[1],
-                                                   self.ai.shape[1]))
-                    for filter_index in range(self.retained_channels):
-                        #self.ai.shape[0]):
-                        signal_component = numpy.outer(self.wi[filter_index, :], 
-                                                       self.ai[filter_index, :])
-                        vmin = min(signal_component.min(), vmin)
-                        vmax = max(signal_component.max(), vmax)
-                        
-                        signal_components.append(signal_component)
-                        complete_signal += signal_component
+                    # estimated by xDAWN (outer products of w_i and a_i)
+                    wi = self.wi[:self.retained_channels]
+                    ai = self.ai[:self.retained_channels]
+                    signal_components = wi[:, :, None] * ai[:, None, :]
+                    vmin = signal_components.min()
+                    vmax = signal_components.max()
+                    complete_signal = numpy.einsum('ic,it->ct', wi, ai)
                     # Plotting
                     import pylab
                     for index, signal_component in enumerate(signal_components):
@@ -399,6 +464,156 @@ class XDAWNNode(SpatialFilteringNode):
                     horizontalalignment='center', verticalalignment='center')
 
 
+@njit(cache=True)
+def _sparse_xdawn_objective(v_1, sigma_1_v_1, sigma_X_v_1, lambda_):
+    """ The objective function from the paper from Rivet et al.
+
+    Instead of sigma_1 and sigma_X, their products with *v_1* are passed,
+    since these are needed for the subgradient as well.
+    """
+    a = numpy.dot(v_1, sigma_1_v_1)  # 0-d, skip trace!
+    b = numpy.dot(v_1, sigma_X_v_1)  # 0-d, skip trace!
+    c = numpy.abs(v_1).sum() / numpy.sqrt(numpy.dot(v_1, v_1))
+
+    return a / b - lambda_*c
+
+
+def _sparse_xdawn_subgradient_py(v_1, sigma_1_v_1, sigma_X_v_1, lambda_):
+    """ Subgradient of the sparse xDAWN objective at *v_1* (numpy version) """
+    a = sigma_X_v_1
+    b = numpy.dot(v_1, a)
+    c = sigma_1_v_1
+    d = numpy.dot(v_1, c)
+
+    v_1_squared = numpy.dot(v_1, v_1)
+    l1 = numpy.abs(v_1).sum()
+
+    e = numpy.sign(v_1) / numpy.sqrt(v_1_squared)
+    f = (l1 / v_1_squared**1.5) * v_1
+
+    # Subgradient components
+    sg1 = 2.0/b*(c - d/b*a)
+    sg2 = e - f
+
+    return sg1 - lambda_ * sg2
+
+
+@njit(cache=True, fastmath=True)
+def _sparse_xdawn_subgradient_nb(v_1, sigma_1_v_1, sigma_X_v_1, lambda_):
+    """ Subgradient of the sparse xDAWN objective at *v_1* (numba version)
+
+    All reductions are done in one loop and the subgradient in a second
+    elementwise loop, without the temporary arrays of the numpy version.
+    This is only fast when compiled with numba.
+    """
+    a = sigma_X_v_1
+    c = sigma_1_v_1
+    b = 0.0
+    d = 0.0
+    v_1_squared = 0.0
+    l1 = 0.0
+    for i in range(v_1.shape[0]):
+        b += v_1[i] * a[i]
+        d += v_1[i] * c[i]
+        v_1_squared += v_1[i] * v_1[i]
+        l1 += abs(v_1[i])
+    l2 = numpy.sqrt(v_1_squared)
+    f_scale = l1 / (v_1_squared * l2)
+
+    subgradient = numpy.empty_like(v_1)
+    for i in range(v_1.shape[0]):
+        sign = numpy.sign(v_1[i])
+        subgradient[i] = 2.0/b*(c[i] - d/b*a[i]) \
+            - lambda_ * (sign / l2 - f_scale * v_1[i])
+    return subgradient
+
+
+_sparse_xdawn_subgradient = _sparse_xdawn_subgradient_nb \
+    if _NUMBA_AVAILABLE else _sparse_xdawn_subgradient_py
+
+
+@njit(cache=True)
+def _sparse_xdawn_gradient_ascent(sigma_1, sigma_X, lambda_, max_evals, seed):
+    """ Maximize the sparse xDAWN objective by restarted subgradient ascent
+
+    The random start states are drawn after seeding the random number
+    generator with *seed*. This function is compiled with numba if available.
+    """
+    numpy.random.seed(seed)
+    num_channels = sigma_X.shape[0]
+    best_f_value = -numpy.inf
+    best_v_1 = numpy.zeros(num_channels)
+    evals = 0
+
+    # Start several repetitions at random start states
+    while True:
+        # Initialize electrode weight vector randomly
+        v_1 = numpy.random.random(num_channels)
+        v_1 /= numpy.linalg.norm(v_1, 2)
+        # Products with sigma_X and sigma_1 and objective value of v_1; they
+        # are kept up to date with v_1 and reused for the subgradient
+        # NOTE: Although sigma_X and sigma_1 are symmetric, BLAS symv (or a
+        #       loop over one triangle) is slower than the gemv behind
+        #       numpy.dot for matrices of the size of a channel covariance.
+        a = numpy.dot(sigma_X, v_1)
+        c = numpy.dot(sigma_1, v_1)
+        f_value = _sparse_xdawn_objective(v_1, c, a, lambda_)
+
+        # Set initial learning rate
+        rho = 1.0
+
+        # Gradient ascent until we are very close to a local maximum
+        while rho > 1e-5:
+            # Construct subgradient
+            subgradient = _sparse_xdawn_subgradient(v_1, c, a, lambda_)
+
+            # Search for a learning rate such that following the gradient
+            # does not bring us too far ahead of the optimum
+            v_1_old = v_1.copy()
+            a_old = a
+            c_old = c
+            old_f_value = f_value
+            while True:
+                evals += 1
+                # Update and renormalize weight vector v
+                v_1 += rho * subgradient
+                v_1 /= numpy.linalg.norm(v_1, 2)
+                a = numpy.dot(sigma_X, v_1)
+                c = numpy.dot(sigma_1, v_1)
+                f_value = _sparse_xdawn_objective(v_1, c, a, lambda_)
+
+                # Check if the current learning rate is too large
+                if f_value >= old_f_value:
+                    # Not followed gradient too far, increase learning rate
+                    # and break
+                    rho /= 0.9
+                    break
+
+                # Reduce learning rate and restore original v_1
+                rho *= 0.9
+                v_1 = v_1_old.copy()
+                a = a_old
+                c = c_old
+                f_value = old_f_value
+
+                # If the learning rate becomes too low, we break
+                if rho < 1e-5:
+                    break
+
+            # Break if we have spent the allowed time searching the maximum
+            if evals >= max_evals:
+                break
+
+        # Check if we have found a new optimum in this repetition
+        if f_value > best_f_value:
+            best_f_value = f_value
+            best_v_1 = v_1
+
+        # Return if we have spent the allowed time searching the maximum
+        if evals >= max_evals:
+            return best_v_1
+
+
 class SparseXDAWNNode(XDAWNNode):
     """ Sparse xDAWN spatial filter for enhancing event-related potentials.
     
@@ -465,27 +680,23 @@ class SparseXDAWNNode(XDAWNNode):
     def _stop_training(self, debug=False):
         if self.num_selected_electrodes is None:
             self.num_selected_electrodes = self.retained_channels
-        # Estimate of the signal for class 1 (the erp_class_label class)
-        A_1 = numpy.dot(numpy.dot(numpy.linalg.inv(numpy.dot(self.D.T, self.D)),
-                                  self.D.T),
-                        self.X)
-        # Estimate of Sigma 1 and Sigma X
-        sigma_1 = numpy.dot(numpy.dot(numpy.dot(A_1.T, self.D.T),
-                                      self.D), A_1)
-        sigma_X = numpy.dot(self.X.T, self.X)
-
-        def objective_function(v_1, lambda_):
-            """ The objective function from the paper from Rivet et al. """
-            a = numpy.dot(numpy.dot(v_1.T, sigma_1), v_1)  # 0-d, skip trace!
-            b = numpy.dot(numpy.dot(v_1.T, sigma_X), v_1)  # 0-d, skip trace!
-            c = numpy.linalg.norm(v_1, 1) / numpy.linalg.norm(v_1, 2)
-            
-            return a / b - lambda_*c
-        
+        self._construct_training_matrices()
+        # Estimate of the signal for class 1 (the erp_class_label class):
+        # (D^T*D)^-1*D^T*X is the mean over the examples of this class
+        num_erp = numpy.count_nonzero(self.target_mask) // self.window_length
+        A_1 = self.X[self.target_mask].reshape(
+            num_erp, self.window_length, -1).mean(axis=0)
+        # Estimate of Sigma 1 = n*A_1^T*A_1 (since D^T*D = n*I) and
+        # Sigma X = X^T*X as symmetric rank-k updates (upper triangle only)
+        syrk = get_blas_funcs('syrk', (self.X,))
+        sigma_1 = syrk(alpha=num_erp, a=A_1, trans=1)
+        sigma_X = syrk(alpha=1.0, a=self.X, trans=1)
+        sigma_1 += numpy.triu(sigma_1, 1).T
+        sigma_X += numpy.triu(sigma_X, 1).T
+
         # Compute the non-pruned weights
-        v_1 = self._gradient_optimization(
-            objective_function=lambda x: objective_function(x, self.lambda_),
-            sigma_1=sigma_1, sigma_X=sigma_X, max_evals=25000)
+        v_1 = self._gradient_optimization(sigma_1=sigma_1, sigma_X=sigma_X,
+                                          max_evals=25000)
         # Prune weight vector such that only self.num_selected_electrodes keep 
         # entries != 0 (those with the largest weight)
         threshold = sorted(numpy.absolute(v_1))[-self.num_selected_electrodes]
@@ -497,82 +708,23 @@ class SparseXDAWNNode(XDAWNNode):
         self.selected_channels = [self.channel_names[index]
                                   for index in self.selected_indices]
 
-    def _gradient_optimization(self, objective_function, sigma_1, sigma_X,
-                               max_evals=25000):
-        best_f_value = -numpy.inf
-        best_v_1 = None
-        evals = 0
-        rep = 0
-
-        # Start several repetitions at random start states
-        while True:
-            rep += 1
-            # Initialize electrode weight vector randomly
-            v_1 = numpy.random.random(self.X.shape[1])
-            v_1 /= numpy.linalg.norm(v_1, 2)
-
-            # Set initial learning rate
-            rho = 1.0
-            
-            # Gradient ascent until we are very close to a local maximum 
-            while rho > 10**-5:
-                # Some intermediate results
-                a = numpy.dot(sigma_X, v_1)
-                b = numpy.dot(v_1.T, a)
-                c = numpy.dot(sigma_1, v_1)
-                d = numpy.dot(v_1.T, c)
-                
-                e = numpy.dot(
-                    numpy.diag(numpy.sign(v_1)), numpy.ones(self.X.shape[1])) \
-                    / numpy.linalg.norm(v_1, 2)
-                f = numpy.dot(
-                    numpy.linalg.norm(v_1, 1) / (numpy.dot(v_1.T, v_1)**1.5),
-                    v_1)
-                
-                # Subgradient components
-                sg1 = 2.0/b*(c - d/b*a)
-                sg2 = e - f
-                
-                # Construct subgradient
-                subgradient = sg1 - self.lambda_ * sg2
-                               
-                # Search for a learning rate such that following the gradient
-                # does not bring us too far ahead of the optimum
-                v_1_old = numpy.array(v_1)
-                old_f_value = objective_function(v_1)
-                while True:
-                    evals += 1
-                    # Update and renormalize weight vector v
-                    v_1 += rho * subgradient
-                    v_1 /= numpy.linalg.norm(v_1, 2)
-                    
-                    # Check if the current learning rate is too large
-                    if objective_function(v_1) >= old_f_value:
-                        # Not followed gradient too far, increase learning rate
-                        # and break
-                        rho /= 0.9
-                        break
-                
-                    # Reduce learning rate and restore original v_1
-                    rho *= 0.9                    
-                    v_1 = numpy.array(v_1_old)
-                    
-                    # If the learning rate becomes too low, we break
-                    if rho < 10**-5:
-                        break
-                    
-                # Break if we have spent the allowed time searching the maximum
-                if evals >= max_evals: break
-                
-            # Check if we have found a new optimum in this repetition    
-            if objective_function(v_1) > best_f_value:
-                best_f_value = objective_function(v_1)
-                best_v_1 = v_1
-            
-            # Return if we have spent the allowed time searching the maximum
-            if evals >= max_evals:
-                return best_v_1
-            
+    def _gradient_optimization(self, sigma_1, sigma_X, max_evals=25000):
+        """ Find the non-pruned electrode weights by gradient ascent
+
+        The random start states of the gradient ascent are derived from the
+        global numpy random state, which is only advanced by drawing a seed.
+        """
+        seed = numpy.random.randint(2**31 - 1)
+        random_state = numpy.random.get_state()
+        try:
+            return _sparse_xdawn_gradient_ascent(
+                numpy.ascontiguousarray(sigma_1, dtype=numpy.float64),
+                numpy.ascontiguousarray(sigma_X, dtype=numpy.float64),
+                float(self.lambda_), int(max_evals), seed)
+        finally:
+            # Without numba the global random state is used by the kernel
+            numpy.random.set_state(random_state)
+
     def _execute(self, data):
         """ Project the data onto the selected channels. """
         projected_data = data[:, self.selected_indices]
@@ -612,8 +764,15 @@ class SSNR(BaseNode):
         self.retained_channels = retained_channels
         self.erp_class_label = erp_class_label
         
-        self.X = None # The data matrix (will be constructed iteratively)
-        self.D = None # The Toeplitz matrix (will be constructed iteratively)
+        # The added examples and for each of their rows whether it belongs to
+        # the ERP class (the data matrix is constructed from them on demand)
+        self._chunks = []
+        self._masks = []
+        self.window_length = None
+        self._X = None
+        self._target_mask = None
+        # Buffer for the filters expanded to all electrodes
+        self._filters_buf = None
 
     def add_example(self, data, label):
         """ Add the example *data* for class *label*. """
@@ -621,19 +780,30 @@ class SSNR(BaseNode):
             self.retained_channels = data.shape[1]
         else:
             self.retained_channels = min(self.retained_channels, data.shape[1])
-        
-        # Iteratively construct Toeplitz matrix D and data matrix X
-        if label == self.erp_class_label:
-            D = numpy.diag(numpy.ones(data.shape[0]))
-        else:
-            D = numpy.zeros((data.shape[0], data.shape[0]))
-            
+
+        self._chunks.append(data.view(numpy.ndarray))
+        self._masks.extend([label == self.erp_class_label] * data.shape[0])
+        self.window_length = data.shape[0]
+        self._X = None
+
+    @property
+    def X(self):
+        """ The data matrix, constructed from the added examples once """
+        if self._X is None and self._chunks:
+            X = numpy.concatenate(self._chunks, axis=0)
+            # checked once here, the decompositions skip this check
+            if not numpy.isfinite(X).all():
+                raise ValueError("Data must not contain infs or NaNs.")
+            self._X = X
+            self._target_mask = numpy.array(self._masks)
+        return self._X
+
+    @property
+    def target_mask(self):
+        """ Mask of the rows of the data matrix belonging to the ERP class """
         if self.X is None:
-            self.X = deepcopy(data)
-            self.D = D
-        else:
-            self.X = numpy.vstack((self.X, data))
-            self.D = numpy.vstack((self.D, D))
+            return None
+        return self._target_mask
 
     def ssnr_as(self, selected_electrodes=None):
         """ SSNR for given electrode selection in actual sensor space. 
@@ -644,7 +814,8 @@ class SSNR(BaseNode):
         if selected_electrodes is None:
             selected_electrodes = range(self.X.shape[1])
             
-        self.Sigma_1, self.Sigma_X = self._compute_Sigma(self.X, self.D)
+        self.Sigma_1, self.Sigma_X = \
+            self._compute_Sigma(self.X, self.target_mask, self.window_length)
         
         filters = numpy.zeros(shape=(self.X.shape[1], self.X.shape[1]))
         for electrode_index in selected_electrodes:
@@ -662,31 +833,27 @@ class SSNR(BaseNode):
         if selected_electrodes is None:
             selected_electrodes = range(self.X.shape[1])
             
-        self.Sigma_1, self.Sigma_X = self._compute_Sigma(self.X, self.D)
+        self.Sigma_1, self.Sigma_X = \
+            self._compute_Sigma(self.X, self.target_mask, self.window_length)
         
         # Determine spatial filter using xDAWN that would be obtained if
         # only the selected electrodes would be available
         partial_filters = \
-            self._compute_xDAWN_filters(self.X[:, selected_electrodes], 
-                                        self.D)
-        # Expand partial filters to a filter for all electrodes (by setting
-        # weights of inactive electrodes to 0)
-        filters = numpy.zeros((self.X.shape[1], self.retained_channels))
-        # Iterate over electrodes with non-zero weights
-        for index, electrode_index in enumerate(selected_electrodes):
-            # Iterate over non-zero spatial filters
-            for j in range(min(filters.shape[1], partial_filters.shape[1])):
-                filters[electrode_index, j] = partial_filters[index, j]
+            self._compute_xDAWN_filters(self.X[:, selected_electrodes],
+                                        self.target_mask, self.window_length)
+        filters = self._expand_filters(partial_filters, selected_electrodes)
 
         # Return the SSNR that these filters would obtain on training data            
         return self._ssnr(filters, self.Sigma_1, self.Sigma_X)
     
-    def ssnr_vs_test(self, X_test, D_test, selected_electrodes=None):
+    def ssnr_vs_test(self, X_test, labels_test, selected_electrodes=None):
         """ SSNR for given electrode selection in virtual sensor space. 
         
         Note that the training of the xDAWN spatial filter for mapping to 
         virtual sensor space and the computation of the SSNR in this virtual 
-        sensor space are done on different data sets. 
+        sensor space are done on different data sets. The test data *X_test*
+        consists of the stacked test examples, whose class labels are given
+        in *labels_test*.
         
         If no electrode selection is given, the SSNR of all electrodes is 
         computed.
@@ -697,72 +864,83 @@ class SSNR(BaseNode):
         # Determine spatial filter using xDAWN that would be obtained if
         # only the selected electrodes would be available
         partial_filters = \
-            self._compute_xDAWN_filters(self.X[:, selected_electrodes], 
-                                        self.D)
-        # Expand partial filters to a filter for all electrodes (by setting
-        # weights of inactive electrodes to 0)
-        filters = numpy.zeros((self.X.shape[1], self.retained_channels))
-        # Iterate over electrodes with non-zero weights
-        for index, electrode_index in enumerate(selected_electrodes):
-            # Iterate over non-zero spatial filters
-            for j in range(min(filters.shape[1], partial_filters.shape[1])):
-                filters[electrode_index, j] = partial_filters[index, j]
+            self._compute_xDAWN_filters(self.X[:, selected_electrodes],
+                                        self.target_mask, self.window_length)
+        filters = self._expand_filters(partial_filters, selected_electrodes)
 
         # Return the SSNR that these filters would obtain on test data
-        Sigma_1_test, Sigma_X_test = self._compute_Sigma(X_test, D_test)
+        window_length = X_test.shape[0] // len(labels_test)
+        target_mask = numpy.repeat(
+            [label == self.erp_class_label for label in labels_test],
+            window_length)
+        Sigma_1_test, Sigma_X_test = \
+            self._compute_Sigma(X_test, target_mask, window_length)
         return self._ssnr(filters, Sigma_1_test, Sigma_X_test)
         
-    def _compute_Sigma(self, X, D):
-        if D is None:
+    def _expand_filters(self, partial_filters, selected_electrodes):
+        # Expand partial filters to a filter for all electrodes (by setting
+        # weights of inactive electrodes to 0). The returned array is reused
+        # by the next call.
+        shape = (self.X.shape[1], self.retained_channels)
+        if self._filters_buf is None or self._filters_buf.shape != shape:
+            self._filters_buf = numpy.zeros(shape)
+        else:
+            self._filters_buf.fill(0)
+        filters = self._filters_buf
+        num_filters = min(filters.shape[1], partial_filters.shape[1])
+        filters[numpy.asarray(selected_electrodes), :num_filters] = \
+            partial_filters[:, :num_filters]
+        return filters
+
+    def _compute_Sigma(self, X, target_mask, window_length):
+        # The rows of D that are nonzero are given by *target_mask*; D
+        # consists of identity blocks of size *window_length* in these rows
+        if X is None:
             warnings.warn("No data given for sigma computation.")
-        elif not(1 in D):
+        elif not target_mask.any():
             warnings.warn("No ERP data (%s) provided." % self.erp_class_label)
-        # Estimate of the signal for class 1 (the erp_class_label class)
-        A_1 = numpy.dot(numpy.dot(numpy.linalg.inv(numpy.dot(D.T, D)), D.T), X)
-        # Estimate of Sigma 1 and Sigma X
-        Sigma_1 = numpy.dot(numpy.dot(numpy.dot(A_1.T, D.T), D), A_1)
+        # Estimate of the signal for class 1 (the erp_class_label class):
+        # (D^T*D)^-1*D^T*X is the mean over the n examples of this class
+        num_erp = numpy.count_nonzero(target_mask) // window_length
+        A_1 = X[target_mask].reshape(num_erp, window_length, -1).mean(axis=0)
+        # Estimate of Sigma 1 (using D^T*D = n*I) and Sigma X
+        Sigma_1 = num_erp * numpy.dot(A_1.T, A_1)
         Sigma_X = numpy.dot(X.T, X)
-        
-        return Sigma_1, Sigma_X        
-        
+
+        return Sigma_1, Sigma_X
+
     def _ssnr(self, v, Sigma_1, Sigma_X):
         # Compute SSNR after filtering  with v.
-        a = numpy.trace(numpy.dot(numpy.dot(v.T, Sigma_1), v))
-        b = numpy.trace(numpy.dot(numpy.dot(v.T, Sigma_X), v))
+        # NOTE: trace(v^T*Sigma*v) is the sum of Sigma*(v*v^T) for symmetric
+        #       Sigma, thus one product v*v^T serves both traces
+        VVt = numpy.dot(v, v.T)
+        a = numpy.einsum('ij,ij->', Sigma_1, VVt)
+        b = numpy.einsum('ij,ij->', Sigma_X, VVt)
         return a / b
     
-    def _compute_xDAWN_filters(self, X, D):
+    def _compute_xDAWN_filters(self, X, target_mask, window_length):
         # Compute xDAWN spatial filters
                       
-        # QR decompositions of X and D
-        if map(int, __import__("scipy").__version__.split('.')) >= [0,9,0]:
-            # NOTE: mode='economy'required since otherwise the memory 
-            # consumption is excessive
-            Qx, Rx = qr(X, overwrite_a=True, mode='economic')     
-            Qd, Rd = qr(D, overwrite_a=True, mode='economic')
-        else:
-            # NOTE: econ=True required since otherwise the memory consumption 
-            # is excessive 
-            Qx, Rx = qr(X, overwrite_a=True, econ=True)      
-            Qd, Rd = qr(D, overwrite_a=True, econ=True)       
+        # QR decomposition of X
+        # NOTE: The economic mode is required since otherwise the memory
+        #       consumption is excessive
+        Qx, Rx = qr(X, **_SCIPY_QR_KW)
+
+        # The Toeplitz matrix D has an identity block in the rows given by
+        # *target_mask*, thus D^T*D = n*I and Qd = D/sqrt(n). Qd^T*Qx is the
+        # sum of the ERP blocks of Qx, scaled by 1/sqrt(n).
+        num_erp = numpy.count_nonzero(target_mask) // window_length
+        QdTQx = Qx[target_mask].reshape(num_erp, window_length, -1).sum(
+            axis=0) / numpy.sqrt(num_erp)
 
         # Singular value decomposition of Qd.T Qx
         # NOTE: full_matrices=True required since otherwise we do not get 
         #       num_channels filters. 
-        Phi, Lambda, Psi = numpy.linalg.svd(numpy.dot(Qd.T, Qx), 
-                                           full_matrices=True)
+        Phi, Lambda, Psi = numpy.linalg.svd(QdTQx, full_matrices=True)
         Psi = Psi.T
 
-        # Construct the spatial filters
-        for i in range(Psi.shape[1]):
-            # Construct spatial filter with index i as Rx^-1*Psi_i
-            ui = numpy.dot(numpy.linalg.inv(Rx), Psi[:,i])
-            if i == 0:
-                filters = numpy.atleast_2d(ui).T
-            else:
-                filters = numpy.hstack((filters, numpy.atleast_2d(ui).T))
-                
-        return filters
+        # Construct the spatial filters Rx^-1*Psi_i for all i at once
+        return solve_triangular(Rx, Psi, lower=False)
 
 
 class SSNRSinkNode(BaseNode):
@@ -865,25 +1043,18 @@ class SSNRSinkNode(BaseNode):
                        "ssnr_vs" : self.ssnr.ssnr_vs()}
 
         # Collect test data (if any)
-        X_test = None
-        D_test = None
+        X_test = []
+        labels_test = []
         for data, label in self.input_node.request_data_for_testing():
-            if label == self.erp_class_label:
-                D = numpy.diag(numpy.ones(data.shape[0]))
-            else:
-                D = numpy.zeros((data.shape[0], data.shape[0]))
-                
-            if X_test is None:
-                X_test = deepcopy(data)
-                D_test = D
-            else:
-                X_test = numpy.vstack((X_test, data))
-                D_test = numpy.vstack((D_test, D))
+            labels_test.append(label)
+            X_test.append(data.view(numpy.ndarray))
         
         # If there was separate test data:
         # compute metrics that require test data
-        if X_test is not None:
-            performance["ssnr_vs_test"] = self.ssnr.ssnr_vs_test(X_test, D_test)
+        if X_test:
+            performance["ssnr_vs_test"] = \
+                self.ssnr.ssnr_vs_test(numpy.concatenate(X_test),
+                                       labels_test)
         
         # Add SSNR-based metrics computed in this split to result collection
         self.ssnr_collection.add_split(performance, train=False,
@@ -895,6 +1066,40 @@ class SSNRSinkNode(BaseNode):
         return self.ssnr_collection
     
     
+@njit(cache=True, fastmath=True)
+def _axdawn_rls_update(R1, R2, R2inv, wi):
+    """ One step of the RLS algorithm of Rao and Principe for the GED
+
+    Updates the deflated signal correlation matrices *R1* and the
+    generalized eigenvectors (columns of *wi*) in place. This function is
+    compiled with numba if available.
+    """
+    for i in range(wi.shape[1]):
+        if i > 0:
+            # Deflate the signal correlation by the previous eigenvector
+            w_old = wi[:, i-1].copy()
+            Rold = R1[i-1]
+
+            # (I - Rold*w*w^T / (w^T*Rold*w)) * Rold as a rank one update
+            Rw = numpy.dot(Rold, w_old)
+            r_denom = numpy.dot(w_old, Rw)
+            Rnew = Rold - numpy.outer(Rw, numpy.dot(w_old, Rold)) / r_denom
+            R1[i] = Rnew
+        else:
+            Rnew = R1[0]
+
+        w_new = wi[:, i].copy()
+        w_num = numpy.dot(numpy.dot(w_new, R2), w_new)
+        w_denom = numpy.dot(numpy.dot(w_new, Rnew), w_new)
+
+        # R2^-1*Rnew*w_new, without forming R2^-1*Rnew
+        w_sol_w = numpy.dot(R2inv, numpy.dot(Rnew, w_new))
+
+        w_sol_scale = w_num/w_denom * w_sol_w
+
+        wi[:, i] = w_sol_scale / numpy.linalg.norm(w_sol_scale)
+
+
 class AXDAWNNode(XDAWNNode):
     """ Adaptive xDAWN spatial filter for enhancing event-related potentials.
     
@@ -920,6 +1125,10 @@ class AXDAWNNode(XDAWNNode):
     Optionally, update coefficients can be used for adapting the filter
     estimate.
 
+    The node has to see at least one training example before it can be
+    executed. Executing an untrained node raises a RuntimeError (earlier
+    versions initialized random filters on execution).
+
     **References**
 
         ========= ==============================================================
@@ -966,6 +1175,14 @@ class AXDAWNNode(XDAWNNode):
 
             (*optional, default: 0.01*)
 
+        :recompute_every: Number of training examples after which the
+            filters are recomputed. Larger values save computation in online
+            settings, but the RLS iteration then only advances once per
+            batch of examples. The filters are always recomputed at the end
+            of the training. *None* is the same as 1.
+
+            (*optional, default: 1*)
+
     **Exemplary Call**
     
     .. code-block:: yaml
@@ -988,9 +1205,16 @@ class AXDAWNNode(XDAWNNode):
                  lambda_noise=1.0,
                  delta=0.25,
                  w_ini=0.01,
+                 recompute_every=1,
                  **kwargs):
         super(AXDAWNNode, self).__init__(**kwargs)
 
+        if recompute_every in [None, 'None']:
+            recompute_every = 1
+        recompute_every = int(recompute_every)
+        if recompute_every < 1:
+            raise ValueError("recompute_every has to be a positive integer.")
+
         self.set_permanent_attributes(
             class_labels=[],
             lambda_signal=lambda_signal,
@@ -1001,12 +1225,20 @@ class AXDAWNNode(XDAWNNode):
             w_ini=w_ini,
             ai=None,
             R1=None,
+            _R1_dirty=False,
             R2=None,
             R2inv=None,
+            # R2inv is the inverse of R2 plus this multiple of the identity
+            _noise_reg=None,
+            # number of Woodbury updates of R2inv since its last refactorization
+            _noise_updates=0,
+            _refactor_every=100,
             filters=None,
             num_noise=0,
             num_signals=0,
             comp_type=comp_type,
+            recompute_every=recompute_every,
+            _filters_outdated=False,
             num_train_items=0)
 
     def initialize_filters(self, data):
@@ -1020,6 +1252,7 @@ class AXDAWNNode(XDAWNNode):
             self.wi = self.w_ini * numpy.random.rand(
                 data.shape[1], self.retained_channels)
             self.R2inv = self.delta * numpy.eye(data.shape[1], data.shape[1])
+            self._noise_reg = 1.0 / self.delta
             self.filters = self.wi
     
     def _train(self, data, class_label):
@@ -1034,14 +1267,17 @@ class AXDAWNNode(XDAWNNode):
 
         self.initialize_filters(data)
 
-        data = data.view(numpy.ndarray)
+        # one contiguous double precision copy at most, which is then used
+        # for the signal and the noise update
+        data = numpy.ascontiguousarray(data.view(numpy.ndarray),
+                                       dtype=numpy.float64)
         # a target => signal
         if class_label == self.erp_class_label:
             # update signal estimation
             self.num_signals += 1
             self.ai = self.predict_lambda_signal * self.ai + \
                 (data - self.ai) / self.num_signals
-            self.R1[0] = numpy.dot(self.ai.T,self.ai)
+            self._R1_dirty = True
             # update noise estimation
             self.adapt_inverse_noise_correlation(data)
         else:
@@ -1053,83 +1289,85 @@ class AXDAWNNode(XDAWNNode):
         if self.num_signals == 0:
             return
 
+        self._filters_outdated = True
+        if self.num_train_items % self.recompute_every == 0:
+            self._update_filters()
+
+    def _update_filters(self):
+        """ Recompute the filters from the current correlation estimates """
+        self._filters_outdated = False
+        # the filters change, the projection has to pick them up again
+        self._filters_active = None
+        self._ensure_signal_correlation()
+
         if self.comp_type == "eig":
-            D, V = scipy.linalg.eigh(self.R1[0], self.R2, right=True)  
-            D = D.real
-            V = V.real 
-            # Sorting the eigenvalues in ascending order
-            I = numpy.argsort(D)
-            # Eigenvectors are sorted in descending order
-            V = V[:, I[::-1]]
-            self.filters = V.T
+            # only the eigenvectors of the largest eigenvalues are needed
+            num_channels = self.R2.shape[0]
+            subset = {_EIGH_SUBSET_KEYWORD:
+                      (num_channels - self.retained_channels,
+                       num_channels - 1)}
+            # same regularized noise correlation as used for R2inv, which is
+            # positive definite even before enough samples were seen
+            D, V = eigh(self.R1[0],
+                        self.R2 + self._noise_reg * numpy.eye(num_channels),
+                        **subset)
+            # Eigenvalues come in ascending order, the filters are
+            # sorted in descending order
+            self.filters = V[:, ::-1]
 
         elif self.comp_type == "rls":
             # compute the generalized eigenvalue decomposition
             # based on the RLS algorithm of Rao and Principe
-            I = numpy.eye(self.R1[0].shape[1]) 
-            for i in xrange(self.retained_channels):
-                if i > 0:
-                    w_old = self.wi[:, i-1]
-                    w_old = numpy.reshape(w_old,(self.R1[0].shape[1], 1))
-                    Rold = self.R1[i-1, :]
-                    Rold = numpy.reshape(Rold,
-                        (self.R1[0].shape[1], self.R1[0].shape[1]))
-
-                    r_num = numpy.dot(w_old, w_old.T)
-                    r_num = numpy.dot(Rold, r_num)
-                    r_denom = numpy.dot(w_old.T, Rold)
-                    r_denom = numpy.dot(r_denom, w_old)
-                    scale = r_num / r_denom
-                    Rnew = numpy.dot(I - scale, Rold)
-                    self.R1[i] = Rnew
-                else:
-                    Rnew = self.R1[0]
-
-                w_new = self.wi[:,i]
-                w_new = numpy.reshape(w_new, (self.R1[0].shape[1],1))
-                w_num = numpy.dot(w_new.T, self.R2)
-                w_num = numpy.dot(w_num, w_new)
-
-                w_denom = numpy.dot(w_new.T, Rnew)
-                w_denom = numpy.dot(w_denom, w_new)
-
-                sol = self.R2inv
-                w_sol = numpy.dot(sol, Rnew)
-                
-                w_sol_w = numpy.dot(w_sol, w_new)
-
-                w_sol_scale = w_num/w_denom * w_sol_w
-                
-                w_norm = w_sol_scale / numpy.linalg.norm(w_sol_scale)
+            _axdawn_rls_update(self.R1, self.R2, self.R2inv, self.wi)
 
-                self.wi[:, i] = w_norm[:, 0]
+            # normalize the filters to unit noise power, in reversed order
+            denom_factors = numpy.einsum('ij,ij->j', self.wi,
+                                         numpy.dot(self.R2, self.wi))
+            self.filters = (self.wi / numpy.sqrt(denom_factors))[:, ::-1]
 
-            denom_factors = \
-                numpy.diag(numpy.dot(numpy.dot(self.wi.T, self.R2), self.wi))
-            weights = numpy.zeros(self.wi.shape)
-            
-            for i in range(self.wi.shape[1]):
-                weights[:, i] = numpy.sqrt(
-                    (1/denom_factors[self.retained_channels-i-1])) * \
-                    self.wi[:, self.retained_channels-i-1]
-                
-            self.filters = weights
+    def _ensure_signal_correlation(self):
+        """ Recompute the signal correlation R1[0] if the ERP estimate changed
+        """
+        if self._R1_dirty:
+            self.R1[0] = numpy.dot(self.ai.T, self.ai)
+            self._R1_dirty = False
 
     def adapt_inverse_noise_correlation(self, data):
-        # compute the inverse of the noise correlation technique 
-        # based on the Sherman-Morrison formula
-        Ri = self.R2inv
-        for i in xrange(data.shape[0]):
-            self.R2 = self.predict_lambda_noise * self.R2 + \
-                numpy.dot(data[[i], :].T, data[[i], :])
-            u = data[[i], :].T
-            vt = u.T
-            Riu = numpy.dot(Ri, u)
-            vtRi = numpy.dot(vt, Ri)
-            denom = 1.0 + 1.0/self.predict_lambda_noise * numpy.dot(vt, Riu)
-            Ri = 1.0/self.predict_lambda_noise * Ri - \
-                1.0/self.predict_lambda_noise**2 * numpy.dot(Riu, vtRi) / denom
-        self.R2inv = Ri
+        # compute the inverse of the noise correlation technique
+        lambda_ = self.predict_lambda_noise
+        num_samples = data.shape[0]
+        num_channels = data.shape[1]
+        # sample i is discounted by lambda^(T-1-i) in the recursive update
+        U = data.T * numpy.sqrt(
+            lambda_ ** numpy.arange(num_samples - 1, -1, -1))
+        lambda_T = lambda_ ** num_samples
+
+        self.R2 = lambda_T * self.R2 + numpy.dot(U, U.T)
+        self._noise_reg *= lambda_T
+        self._noise_updates += 1
+
+        # Refactorize if this is cheaper than the Woodbury update (long
+        # windows) and periodically, to discard the rounding errors that
+        # the updates accumulate
+        if num_samples >= num_channels or \
+                self._noise_updates >= self._refactor_every:
+            try:
+                factor = cho_factor(
+                    self.R2 + self._noise_reg * numpy.eye(num_channels))
+            except numpy.linalg.LinAlgError:
+                # numerically singular, keep updating the inverse
+                pass
+            else:
+                self.R2inv = cho_solve(factor, numpy.eye(num_channels))
+                self._noise_updates = 0
+                return
+
+        # based on the Woodbury identity, which is equivalent to one
+        # Sherman-Morrison update per sample of *data*
+        RiU = numpy.dot(self.R2inv, U)
+        S = lambda_T * numpy.eye(num_samples) + numpy.dot(U.T, RiU)
+        self.R2inv = (self.R2inv -
+                      numpy.dot(RiU, numpy.linalg.solve(S, RiU.T))) / lambda_T
 
     def store_state(self, result_dir, index=None): 
         """ Stores this node in the given directory *result_dir* """
@@ -1137,6 +1375,8 @@ class AXDAWNNode(XDAWNNode):
             super(AXDAWNNode,self).store_state(result_dir)
 
     def _stop_training(self, debug=False):
+        if self._filters_outdated:
+            self._update_filters()
         self.predict_lambda_signal = self.lambda_signal
         self.predict_lambda_noise = self.lambda_noise
 
@@ -1145,30 +1385,10 @@ class AXDAWNNode(XDAWNNode):
 
     def _execute(self, data):
         """ Apply the learned spatial filters to the given data point """
-        self.initialize_filters(data)
-        if self.channel_names is None:
-            self.channel_names = data.channel_names
-
-        if self.retained_channels in [None, 'None']:
-                self.retained_channels = len(self.channel_names)
-
-        if len(self.channel_names) < self.retained_channels:
-            self.retained_channels = len(self.channel_names)
-            self._log("To many channels chosen for the retained channels! "
-                      "Replaced by maximum number.", level=logging.CRITICAL)
-        data_array = data.view(numpy.ndarray)
-        
-        # Project the data using the learned spatial filters
-        projected_data = numpy.dot(data_array,
-                                   self.filters[:, :self.retained_channels])
-
-        if self.xDAWN_channel_names is None:
-            self.xDAWN_channel_names = \
-                ["xDAWN%03d" % i for i in range(self.retained_channels)]
-        
-        return TimeSeries(projected_data, self.xDAWN_channel_names,
-                          data.sampling_frequency, data.start_time,
-                          data.end_time, data.name, data.marker_name)
+        if self.filters is None:
+            raise RuntimeError("%s has to be trained before it can be "
+                               "executed." % self.__class__.__name__)
+        return super(AXDAWNNode, self)._execute(data)
 
 
 _NODE_MAPPING = {"xDAWN": XDAWNNode,
@@ -16,6 +16,10 @@ if __name__ == '__main__':
     file_path = os.path.dirname(os.path.abspath(__file__))
     sys.path.append(file_path[:file_path.rfind('pySPACE') - 1])
 
+import os
+import shutil
+import tempfile
+import cPickle
 import unittest
 from pySPACE.missions.nodes.spatial_filtering.xdawn import *
 from pySPACE.resources.data_types.time_series import TimeSeries
@@ -23,6 +27,36 @@ import pySPACE.tests.generic_unittest as gen_test
 import numpy
 
 
+def toeplitz_matrix(labels, window_length, erp_class_label="Target"):
+    """ Explicit Toeplitz matrix D of xDAWN for windows with *labels*
+
+    D consists of an identity block for each window of the ERP class and of
+    a zero block for all other windows.
+    """
+    return numpy.vstack([numpy.eye(window_length) * (label == erp_class_label)
+                         for label in labels])
+
+
+def random_windows(random, labels, window_length, num_channels):
+    """ Random windows with *labels*, with an ERP added for targets """
+    pattern = random.randn(window_length, num_channels)
+    windows = []
+    for label in labels:
+        data = random.randn(window_length, num_channels)
+        if label == "Target":
+            data += pattern
+        windows.append(TimeSeries(
+            data, channel_names=["C%d" % i for i in range(num_channels)],
+            sampling_frequency=100.0))
+    return windows
+
+
+def same_up_to_sign(a, b):
+    """ Whether the columns of *a* and *b* are equal up to their signs """
+    signs = numpy.sign(numpy.sum(a * b, axis=0))
+    return numpy.allclose(a, b * signs)
+
+
 class XDAWNTestCase(unittest.TestCase):
 
     def setUp(self):
@@ -53,24 +87,299 @@ class XDAWNTestCase(unittest.TestCase):
             x_dawn.train(elem, 'Target')
 
         # now we want to check if the input has been successfully categorized
-        # in the X and D matrices
+        # in the X matrix and the mask of the nonzero rows of D
+        x_dawn._construct_training_matrices()
         X = [[-1., 1.5], [-1., 1.5], [-1., 1.5], [-1., 1.5],
              [0., 0.], [0., 0.], [0., 0.], [0., 0.],
              [1.5, -1.], [1.5, -1.], [1.5, -1.], [1.5, -1.],
              [0., 0.], [0., 0.], [0., 0.], [0., 0.]]
-        D = [[0., 0., 0., 0.], [0., 0., 0., 0.],
-             [0., 0., 0., 0.], [0., 0., 0., 0.],
-             [0., 0., 0., 0.], [0., 0., 0., 0.],
-             [0., 0., 0., 0.], [0., 0., 0., 0.],
-             [1., 0., 0., 0.], [0., 1., 0., 0.],
-             [0., 0., 1., 0.], [0., 0., 0., 1.],
-             [1., 0., 0., 0.], [0., 1., 0., 0.],
-             [0., 0., 1., 0.], [0., 0., 0., 1.]]
+        target_mask = [False] * 8 + [True] * 8
 
         # since the data has not been processed yet, we want it to be
         # absolutely the same as the input
         self.assertTrue(numpy.allclose(x_dawn.X, X, atol=0))
-        self.assertTrue(numpy.allclose(x_dawn.D, D, atol=0))
+        self.assertTrue(numpy.all(x_dawn.target_mask == target_mask))
+        self.assertEqual(x_dawn.window_length, 4)
+
+        # data collected afterwards is not mixed up with the previous one
+        x_dawn.train(self.target[0], 'Target')
+        x_dawn._construct_training_matrices()
+        self.assertEqual(x_dawn.X.shape[0], len(x_dawn.target_mask))
+
+    def test_explicit_formulation(self):
+        # the filters, patterns and SNR are the ones of the QR decompositions
+        # of X and the explicit Toeplitz matrix D (Rivet et al.)
+        random = numpy.random.RandomState(0)
+        labels = ["Target" if i % 3 == 0 else "Standard" for i in range(18)]
+        for window_length, num_channels in [(5, 4), (3, 6)]:
+            windows = random_windows(random, labels, window_length,
+                                     num_channels)
+            x_dawn = XDAWNNode(erp_class_label='Target',
+                               visualize_pattern=False)
+            for window, label in zip(windows, labels):
+                x_dawn.train(window, label)
+            x_dawn.stop_training()
+
+            X = numpy.vstack([window.view(numpy.ndarray)
+                              for window in windows])
+            D = toeplitz_matrix(labels, window_length)
+            Qx, Rx = numpy.linalg.qr(X)
+            Qd, Rd = numpy.linalg.qr(D)
+            Phi, Lambda, Psi = numpy.linalg.svd(numpy.dot(Qd.T, Qx))
+            Psi = Psi.T
+            filters = numpy.dot(numpy.linalg.inv(Rx), Psi)
+            wi = numpy.dot(Rx.T, Psi).T
+            num_components = len(Lambda)
+            ai = numpy.dot(numpy.linalg.inv(Rd),
+                           Phi[:, :num_components] * Lambda).T
+            SNR = numpy.zeros(num_channels)
+            for i in range(num_channels):
+                a = numpy.dot(D, ai[min(i, num_components - 1)])
+                b = numpy.dot(X, filters[:, i])
+                SNR[i] = numpy.dot(a, a) / numpy.dot(b, b)
+
+            self.assertTrue(same_up_to_sign(x_dawn.filters, filters))
+            self.assertTrue(same_up_to_sign(x_dawn.wi.T, wi.T))
+            self.assertTrue(same_up_to_sign(x_dawn.ai.T, ai.T))
+            self.assertTrue(numpy.allclose(x_dawn.SNR, SNR))
+
+    def train_node(self):
+        x_dawn = XDAWNNode(erp_class_label='Target', visualize_pattern=False,
+                           store=True)
+        for elem in self.standard:
+            x_dawn.train(elem, 'Standard')
+        for elem in self.target:
+            x_dawn.train(elem, 'Target')
+        x_dawn.stop_training()
+        return x_dawn
+
+    def test_store_and_load(self):
+        # the stored filters can be used by a new node
+        x_dawn = self.train_node()
+        result_dir = tempfile.mkdtemp()
+        try:
+            x_dawn.store_state(result_dir)
+            filter_path = os.path.join(result_dir, "XDAWNNode",
+                                       "patterns_sp%s.npz" %
+                                       x_dawn.current_split)
+            loaded = XDAWNNode(load_filter_path=filter_path)
+        finally:
+            shutil.rmtree(result_dir)
+
+        self.assertTrue(numpy.allclose(loaded.filters, x_dawn.filters))
+        self.assertTrue(numpy.allclose(loaded.execute(self.target[0]),
+                                       x_dawn.execute(self.target[0])))
+
+    def test_load_legacy_pickle(self):
+        # filters stored as pickled (filters, wi, ai) tuple by older versions
+        x_dawn = self.train_node()
+        result_dir = tempfile.mkdtemp()
+        try:
+            filter_path = os.path.join(result_dir, "patterns_sp0.pickle")
+            filters_file = open(filter_path, 'wb')
+            cPickle.dump((x_dawn.filters, x_dawn.wi, x_dawn.ai), filters_file)
+            filters_file.close()
+            loaded = XDAWNNode(load_filter_path=filter_path)
+        finally:
+            shutil.rmtree(result_dir)
+
+        self.assertTrue(numpy.allclose(loaded.filters, x_dawn.filters))
+
+
+class SparseXDAWNTestCase(unittest.TestCase):
+
+    def setUp(self):
+        # the signal is mainly on the first electrode, followed by the second
+        self.sigma_1 = numpy.diag([4.0, 0.5, 0.2, 0.1, 0.1])
+        self.sigma_X = numpy.eye(5) + 0.1 * numpy.ones((5, 5))
+        self.node = SparseXDAWNNode(lambda_=0.1)
+
+    def test_gradient_optimization(self):
+        numpy.random.seed(42)
+        v_1 = self.node._gradient_optimization(self.sigma_1, self.sigma_X,
+                                               max_evals=2000)
+        # the result only depends on the global seed
+        numpy.random.seed(42)
+        self.assertTrue(numpy.allclose(
+            self.node._gradient_optimization(self.sigma_1, self.sigma_X,
+                                             max_evals=2000), v_1))
+
+        # support of the weights after pruning to one and two electrodes
+        self.assertEqual(list(numpy.argsort(-abs(v_1))[:2]), [0, 1])
+        objective = \
+            numpy.dot(v_1, numpy.dot(self.sigma_1, v_1)) / \
+            numpy.dot(v_1, numpy.dot(self.sigma_X, v_1)) - \
+            self.node.lambda_ * abs(v_1).sum() / numpy.linalg.norm(v_1)
+        # better than the first electrode alone (4/1.1 - 0.1)
+        self.assertTrue(objective > 4.0 / 1.1 - 0.1)
+        self.assertAlmostEqual(objective, 3.611256, places=5)
+
+    def test_random_state(self):
+        # the global random state only advances by drawing the seed
+        numpy.random.seed(42)
+        numpy.random.randint(2**31 - 1)
+        expected = numpy.random.random(3)
+        numpy.random.seed(42)
+        self.node._gradient_optimization(self.sigma_1, self.sigma_X,
+                                         max_evals=100)
+        self.assertTrue(numpy.all(numpy.random.random(3) == expected))
+
+
+class SSNRTestCase(unittest.TestCase):
+
+    def setUp(self):
+        random = numpy.random.RandomState(1)
+        self.labels = ["Target" if i % 3 == 0 else "Standard"
+                       for i in range(18)]
+        self.windows = random_windows(random, self.labels, 5, 6)
+        self.test_labels = ["Target" if i % 2 == 0 else "Standard"
+                            for i in range(8)]
+        self.test_windows = random_windows(random, self.test_labels, 5, 6)
+        self.ssnr = SSNR("Target", retained_channels=3)
+        for window, label in zip(self.windows, self.labels):
+            self.ssnr.add_example(window, label)
+
+    def reference_sigma(self, X, D):
+        """ Sigma_1 and Sigma_X computed with the explicit Toeplitz matrix """
+        A_1 = numpy.dot(numpy.linalg.solve(numpy.dot(D.T, D), D.T), X)
+        DA_1 = numpy.dot(D, A_1)
+        return numpy.dot(DA_1.T, DA_1), numpy.dot(X.T, X)
+
+    def reference_ssnr(self, v, Sigma_1, Sigma_X):
+        return numpy.trace(numpy.dot(numpy.dot(v.T, Sigma_1), v)) / \
+            numpy.trace(numpy.dot(numpy.dot(v.T, Sigma_X), v))
+
+    def reference_filters(self, X, D, selected_electrodes):
+        """ xDAWN filters of the selected electrodes, expanded to all """
+        Qx, Rx = numpy.linalg.qr(X[:, selected_electrodes])
+        Qd, Rd = numpy.linalg.qr(D)
+        Phi, Lambda, Psi = numpy.linalg.svd(numpy.dot(Qd.T, Qx))
+        partial_filters = numpy.dot(numpy.linalg.inv(Rx), Psi.T)
+        filters = numpy.zeros((X.shape[1], 3))
+        num_filters = min(3, partial_filters.shape[1])
+        for index, electrode_index in enumerate(selected_electrodes):
+            filters[electrode_index, :num_filters] = \
+                partial_filters[index, :num_filters]
+        return filters
+
+    def training_data(self):
+        return (numpy.vstack([window.view(numpy.ndarray)
+                              for window in self.windows]),
+                toeplitz_matrix(self.labels, 5))
+
+    def test_ssnr_as(self):
+        X, D = self.training_data()
+        Sigma_1, Sigma_X = self.reference_sigma(X, D)
+        for selected_electrodes in [None, [0, 2, 3, 5]]:
+            filters = numpy.zeros((6, 6))
+            for electrode_index in selected_electrodes or range(6):
+                filters[electrode_index, electrode_index] = 1
+            self.assertAlmostEqual(
+                self.ssnr.ssnr_as(selected_electrodes),
+                self.reference_ssnr(filters, Sigma_1, Sigma_X))
+
+    def test_ssnr_vs(self):
+        X, D = self.training_data()
+        Sigma_1, Sigma_X = self.reference_sigma(X, D)
+        for selected_electrodes in [None, [0, 2, 3, 5]]:
+            filters = self.reference_filters(X, D,
+                                             selected_electrodes or range(6))
+            self.assertAlmostEqual(
+                self.ssnr.ssnr_vs(selected_electrodes),
+                self.reference_ssnr(filters, Sigma_1, Sigma_X))
+
+    def test_ssnr_vs_test(self):
+        X, D = self.training_data()
+        X_test = numpy.vstack([window.view(numpy.ndarray)
+                               for window in self.test_windows])
+        D_test = toeplitz_matrix(self.test_labels, 5)
+        for selected_electrodes in [None, [0, 2, 3, 5]]:
+            expected = self.reference_ssnr(
+                self.reference_filters(X, D, selected_electrodes or range(6)),
+                *self.reference_sigma(X_test, D_test))
+            self.assertAlmostEqual(
+                self.ssnr.ssnr_vs_test(X_test, self.test_labels,
+                                       selected_electrodes), expected)
+
+
+class AXDAWNTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.channel_names = ["C%d" % i for i in range(16)]
+        self.random = numpy.random.RandomState(0)
+        self.pattern = self.random.randn(20, 16)
+
+    def window(self, label, length=20):
+        """ Random window with *length* samples, the ERP added for targets """
+        data = self.random.randn(length, 16)
+        if label == "Target":
+            data += self.pattern[:length]
+        return TimeSeries(data, channel_names=self.channel_names,
+                          sampling_frequency=100.0)
+
+    def test_eig(self):
+        # the first windows have fewer samples than channels, so the
+        # noise correlation alone is still singular
+        ax_dawn = AXDAWNNode(erp_class_label="Target", retained_channels=3,
+                             comp_type="eig")
+        for i in range(12):
+            label = "Target" if i % 3 == 0 else "Standard"
+            ax_dawn.train(self.window(label, length=4), label)
+        ax_dawn.stop_training()
+
+        self.assertEqual(ax_dawn.filters.shape, (16, 3))
+        self.assertTrue(numpy.all(numpy.isfinite(ax_dawn.filters)))
+        result = ax_dawn.execute(self.window("Target", length=4))
+        self.assertEqual(result.shape, (4, 3))
+
+    def test_execute_untrained(self):
+        # no filters are initialized on execution
+        ax_dawn = AXDAWNNode(erp_class_label="Target", retained_channels=3)
+        self.assertRaises(RuntimeError, ax_dawn.execute,
+                          self.window("Target"))
+        self.assertTrue(ax_dawn.R2 is None)
+
+    def test_recompute_every(self):
+        self.assertEqual(
+            AXDAWNNode(erp_class_label="Target",
+                       recompute_every=None).recompute_every, 1)
+        self.assertRaises(ValueError, AXDAWNNode, erp_class_label="Target",
+                          recompute_every=0)
+
+    def check_noise_correlation(self, length):
+        # the forgetting factor of the noise is only used after the
+        # initial training
+        ax_dawn = AXDAWNNode(erp_class_label="Target", retained_channels=3,
+                             lambda_noise=0.97)
+        R2 = numpy.zeros((16, 16))
+        for i in range(60):
+            label = "Target" if i % 3 == 0 else "Standard"
+            data = self.window(label, length)
+            if i < 3:
+                ax_dawn.train(data, label)
+                lambda_ = 1.0
+            else:
+                if i == 3:
+                    ax_dawn.stop_training()
+                ax_dawn._inc_train(data, label)
+                lambda_ = 0.97
+            # per sample recursion of the noise correlation
+            for sample in data.view(numpy.ndarray):
+                R2 = lambda_ * R2 + numpy.outer(sample, sample)
+
+        self.assertTrue(numpy.allclose(ax_dawn.R2, R2))
+        R2inv = numpy.linalg.inv(
+            ax_dawn.R2 + ax_dawn._noise_reg * numpy.eye(16))
+        self.assertTrue(numpy.allclose(ax_dawn.R2inv, R2inv,
+                                       rtol=1e-8, atol=1e-12))
+
+    def test_noise_correlation_woodbury(self):
+        # fewer samples than channels: Woodbury updates of R2inv
+        self.check_noise_correlation(length=4)
+
+    def test_noise_correlation_cholesky(self):
+        # at least as many samples as channels: Cholesky refactorizations
+        self.check_noise_correlation(length=20)
 
 
 if __name__ == '__main__':